@@ -1,13 +1,27 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
+import os
+import hmac
+import hashlib
+import secrets
 import time
 import random
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import google.generativeai as genai
+import sqlite3
+import threading
+import json
+import logging
+import functools
+import tempfile
+# plotly, gspread/oauth2client and google.generativeai are imported where first used
+# (chart(), connect_db(), EnterpriseAI), so the login screen doesn't pay for them.
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from pandas.api.types import union_categoricals
 
 # ==========================================
 # 1. AMERICAN INDUSTRY LEVEL SETUP
@@ -15,7 +29,32 @@ from datetime import datetime
 st.set_page_config(page_title="ABHISHEK LUXORA PRO 20.0", page_icon="💎", layout="wide", initial_sidebar_state="expanded")
 
 # --- ENTERPRISE THEME CSS ---
-st.markdown("""
+# The login screen only gets the base rules; the full theme is sent once signed in.
+BASE_CSS = """
+<style>
+    /* Typography */
+    h1, h2, h3 { font-family: 'Segoe UI', sans-serif; color: #0f172a; font-weight: 700; }
+
+    /* Buttons */
+    .stButton>button {
+        background: #1e293b;
+        color: white;
+        border-radius: 8px;
+        padding: 0.6rem;
+        border: none;
+        font-weight: 600;
+        width: 100%;
+        transition: 0.3s;
+    }
+    .stButton>button:hover { background: #334155; box-shadow: 0 8px 15px rgba(0,0,0,0.1); }
+
+    /* Inputs */
+    .stTextInput input, .stNumberInput input, .stSelectbox div[data-baseweb="select"] {
+        border-radius: 8px !important;
+    }
+</style>
+"""
+APP_CSS = """
 <style>
     /* 3D Background Animation */
     @keyframes move {
@@ -29,9 +68,6 @@ st.markdown("""
         animation: move 4s linear infinite;
     }
     
-    /* Typography */
-    h1, h2, h3 { font-family: 'Segoe UI', sans-serif; color: #0f172a; font-weight: 700; }
-    
     /* Metrics Cards */
     .metric-card {
         background: white;
@@ -63,31 +99,188 @@ st.markdown("""
         font-weight: bold;
     }
 
-    /* Buttons */
-    .stButton>button {
-        background: #1e293b;
-        color: white;
-        border-radius: 8px;
-        padding: 0.6rem;
-        border: none;
-        font-weight: 600;
-        width: 100%;
-        transition: 0.3s;
-    }
-    .stButton>button:hover { background: #334155; box-shadow: 0 8px 15px rgba(0,0,0,0.1); }
-
-    /* Tables & Inputs */
+    /* Tables */
     .stDataFrame { border-radius: 10px; overflow: hidden; border: 1px solid #e2e8f0; }
-    .stTextInput input, .stNumberInput input, .stSelectbox div[data-baseweb="select"] {
-        border-radius: 8px !important;
-    }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(BASE_CSS, unsafe_allow_html=True)
 
 # ==========================================
 # 2. ROBUST DATABASE FUNCTIONS
 # ==========================================
+# --- INSTRUMENTATION (per render + process-wide, feeds the SYSTEM MONITOR page) ---
+QUOTA_WINDOW = 60           # seconds; Sheets quotas are per minute
+SHEETS_READ_QUOTA = 60      # read requests per minute per user (all sessions share one service account)
+SHEETS_WRITE_QUOTA = 60     # write requests per minute per user
+
+class Metrics:
+    def __init__(self, log_path=None):
+        self.lock = threading.Lock()
+        self.ops = {}                           # op -> {"calls", "errors", "ms", "max_ms", "hits", "misses"}
+        self.remote_log = deque(maxlen=20000)   # (ts, "read" | "write" | "ai")
+        self.errors = deque(maxlen=50)
+        self.logger = None
+        if log_path:
+            self.logger = logging.getLogger("luxora.metrics")
+            self.logger.setLevel(logging.INFO); self.logger.propagate = False
+            if not self.logger.handlers: self.logger.addHandler(logging.FileHandler(log_path))
+
+    @staticmethod
+    def bump(table, op, ms=0.0, error=None, hit=None):
+        t = table.setdefault(op, {"calls": 0, "errors": 0, "ms": 0.0, "max_ms": 0.0, "hits": 0, "misses": 0})
+        if hit is None:
+            t["calls"] += 1; t["ms"] += ms; t["max_ms"] = max(t["max_ms"], ms)
+            if error is not None: t["errors"] += 1
+        else: t["hits" if hit else "misses"] += 1
+
+    def record(self, op, ms=0.0, error=None, hit=None, remote=None):
+        now = time.time()
+        with self.lock:
+            self.bump(self.ops, op, ms, error, hit)
+            if remote: self.remote_log.append((now, remote))
+            if error is not None: self.errors.append({"time": datetime.now().strftime("%H:%M:%S"), "op": op, "error": f"{type(error).__name__}: {error}"})
+        render = current_render()
+        if render is not None: self.bump(render["ops"], op, ms, error, hit)
+        if self.logger:
+            self.logger.info(json.dumps({"ts": now, "op": op, "ms": round(ms, 2), "error": None if error is None else str(error),
+                                         "hit": hit, "remote": remote, "page": render["page"] if render else None}))
+
+    def quota(self):
+        cutoff = time.time() - QUOTA_WINDOW
+        with self.lock: recent = [k for ts, k in self.remote_log if ts >= cutoff]
+        return {k: recent.count(k) for k in ("read", "write", "ai")}
+
+    def snapshot(self):
+        with self.lock: snap = {"ops": {k: dict(v) for k, v in self.ops.items()}, "errors": list(self.errors)}
+        snap["quota"] = self.quota()
+        return snap
+
+@st.cache_resource
+def metrics(): return Metrics(config("METRICS_LOG"))
+
+def current_render():
+    # Stats of the page render running on this thread; None on background threads.
+    if get_script_run_ctx(suppress_warning=True) is None: return None
+    try: return st.session_state.get("render")
+    except: return None
+
+def begin_render(page):
+    history = st.session_state.setdefault("render_history", deque(maxlen=20))
+    if st.session_state.get("render"): history.append(st.session_state.render)
+    st.session_state.render = {"page": page, "time": datetime.now().strftime("%H:%M:%S"), "ops": {}}
+
+def instrumented(op):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try: result = fn(*args, **kwargs)
+            except Exception as e:
+                metrics().record(op, (time.perf_counter() - start) * 1000, error=e); raise
+            metrics().record(op, (time.perf_counter() - start) * 1000, error=RuntimeError("returned False") if result is False else None)
+            return result
+        return inner
+    return wrap
+
+def config(name, default=None):
+    try: return st.secrets.get(name, os.environ.get(name, default))
+    except: return os.environ.get(name, default)
+
+# --- QUOTA-AWARE SHEETS CLIENT (one per process, shared by every session) ---
+SHEETS_BURST = 10           # seconds of quota a burst may spend at once
+QUOTA_MAX_WAIT = 20         # seconds a request waits for a free slot before giving up
+SHEETS_RETRIES = 4
+RETRY_BASE = 1.0            # seconds; backoff is random(0, base * 2^attempt), capped
+RETRY_MAX = 16
+RETRYABLE = {429, 500, 502, 503, 504}
+
+class QuotaExceeded(Exception):
+    code = 429  # never sent: reads like a rate-limit rejection from Google
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=SHEETS_BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst)
+        self.tokens, self.stamp = self.capacity, time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        # Blocks until a token is free; False if that would take longer than timeout.
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1: self.tokens -= 1; return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline: return False
+            time.sleep(wait)
+
+def api_status(e):
+    return getattr(getattr(e, "response", None), "status_code", None) or getattr(e, "code", None)
+
+def rejected(e):
+    # Google refused the request itself (bad range, too many cells...): sending it again won't help.
+    status = api_status(e)
+    return bool(status) and 400 <= status < 500 and status != 429
+
+class SheetsClient:
+    def __init__(self):
+        self.buckets = {"read": TokenBucket(SHEETS_READ_QUOTA), "write": TokenBucket(SHEETS_WRITE_QUOTA)}
+        self.inflight = {}      # read key -> Future shared by every caller asking for the same thing
+        self.lock = threading.Lock()
+
+    def call(self, kind, fn, *args, **kwargs):
+        if kind != "read": return self.attempt(kind, fn, args, kwargs)
+        key = (id(getattr(fn, "__self__", None)), getattr(fn, "__name__", None), repr(args), repr(kwargs))
+        with self.lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader: future = self.inflight[key] = Future()
+        if not leader:
+            metrics().record("sheets.coalesced", hit=True)
+            return future.result()
+        try:
+            result = self.attempt(kind, fn, args, kwargs)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e); raise
+        finally:
+            with self.lock: self.inflight.pop(key, None)
+
+    def attempt(self, kind, fn, args, kwargs):
+        name = f"sheets.{getattr(fn, '__name__', 'call')}"
+        for attempt in range(SHEETS_RETRIES + 1):
+            start = time.perf_counter()
+            if not self.buckets[kind].acquire(QUOTA_MAX_WAIT):
+                e = QuotaExceeded(f"Sheets {kind} quota busy, gave up after {QUOTA_MAX_WAIT}s")
+                metrics().record(name, error=e); raise e
+            waited = time.perf_counter() - start
+            if waited > 0.05: metrics().record("sheets.throttled", waited * 1000)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                metrics().record(name, (time.perf_counter() - start) * 1000, remote=kind)
+                return result
+            except Exception as e:
+                metrics().record(name, (time.perf_counter() - start) * 1000, e, remote=kind)
+                status = api_status(e)
+                # Writes (appends, row deletes) aren't idempotent: only retry the ones Google rejected outright.
+                retry = status == 429 or (kind == "read" and (status in RETRYABLE or isinstance(e, OSError)))
+                if not retry or attempt == SHEETS_RETRIES: raise
+                delay = random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+                try: delay = max(delay, float(e.response.headers.get("Retry-After")))
+                except: pass
+                metrics().record("sheets.retry", delay * 1000)
+                time.sleep(delay)
+
+@st.cache_resource
+def sheets_client(): return SheetsClient()
+
 @st.cache_resource
+@instrumented("connect_db")
 def connect_db():
     try:
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
@@ -95,70 +288,1017 @@ def connect_db():
             st.error("⚠️ System Error: Credentials Missing.")
             st.stop()
         creds_dict = dict(st.secrets["gcp_service_account"])
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
         creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
         client = gspread.authorize(creds)
         return client.open("Luxora_DB")
     except Exception as e:
         st.error(f"⚠️ Database Connection Failed: {e}"); st.stop()
 
-def ensure_headers(worksheet, headers):
-    try:
-        if not worksheet.row_values(1): worksheet.append_row(headers)
-        elif worksheet.row_values(1)[0] != headers[0]: worksheet.insert_row(headers, index=1)
-    except: pass
+# Column order is the sheet's header row. Kinds: str, num, date, cat (low-cardinality text).
+SCHEMAS = {
+    "Expenses": {"id": "str", "date": "date", "category": "cat", "amount": "num", "user": "cat", "note": "str"},
+    "Loans": {"id": "str", "date": "date", "app_name": "cat", "amount": "num", "interest_rate": "num", "note": "str",
+              "tenure_months": "num", "compounding": "cat"},
+    "Jobs": {"id": "str", "date": "date", "name": "str", "company": "str", "shift": "cat", "salary": "num"},
+    "Users": {"username": "str", "password": "str", "name": "str", "role": "cat"},
+    "Tasks": {"date": "date", "task": "str", "status": "cat", "user": "cat"},
+    "Notebook": {"date": "date", "subject": "str", "note": "str", "user": "cat"},
+    "Attendance": {"date": "date", "subject": "str", "status": "cat", "user": "cat"},
+}
+SHEET_HEADERS = {name: list(cols) for name, cols in SCHEMAS.items()}
+KEY_COLUMNS = {"Expenses": "id", "Loans": "id", "Jobs": "id", "Users": "username"}
+ROLE_SHEETS = {
+    "User": ["Expenses", "Tasks", "Notebook", "Attendance"],
+    "Admin": ["Expenses", "Tasks", "Notebook", "Attendance", "Loans", "Jobs", "Users"],
+}
+ROLLUP_SHEETS = {"Expenses"}      # sheets with materialized (user, month, category) totals
+APPEND_ONLY = {"Expenses", "Attendance", "Tasks", "Notebook"}   # synced by fetching only new rows
+CACHE_TTL = 60      # seconds a downloaded sheet stays fresh
+CACHE_SIZE = 16     # max sheets held in memory
+FLUSH_DELAY = 0.5   # seconds the write-behind queue waits to batch a burst of rows
+FLUSH_MAX_BACKOFF = 60
+DEAD_LETTER_MAX = 500   # rows Sheets rejected outright, kept for the sidebar
+PREFETCH_WORKERS = 4
+FULL_SYNC_EVERY = 600   # seconds between full re-downloads of append-only sheets (catches external edits)
 
-def get_data(sheet_name):
-    try:
-        sh = connect_db()
-        ws = sh.worksheet(sheet_name)
-        if sheet_name == "Expenses": ensure_headers(ws, ["id", "date", "category", "amount", "user", "note"])
-        elif sheet_name == "Loans": ensure_headers(ws, ["id", "date", "app_name", "amount", "interest_rate", "note"])
-        elif sheet_name == "Jobs": ensure_headers(ws, ["id", "date", "name", "company", "shift", "salary"])
-        elif sheet_name == "Users": ensure_headers(ws, ["username", "password", "name", "role"])
-        return pd.DataFrame(ws.get_all_records())
-    except: return pd.DataFrame()
-
-def add_row(sheet_name, row_data):
-    try: connect_db().worksheet(sheet_name).append_row(row_data); return True
-    except: return False
-
-def delete_row_by_id(sheet_name, col_name, id_val):
-    try:
-        ws = connect_db().worksheet(sheet_name)
-        cell = ws.find(str(id_val))
-        ws.delete_rows(cell.row)
+# --- SHARED SHEET CACHE (all sessions) ---
+class TTLCache:
+    def __init__(self, ttl, maxsize):
+        self.ttl, self.maxsize = ttl, maxsize
+        self.data = OrderedDict()
+        self.gens = {}
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.data.get(key)
+            if hit is None: return None
+            if time.time() - hit[0] > self.ttl: del self.data[key]; return None
+            self.data.move_to_end(key)
+            return hit[1]
+
+    def generation(self, key):
+        with self.lock: return self.gens.get(key, 0)
+
+    def put(self, key, value, gen=None):
+        with self.lock:
+            # A write landed while this value was being fetched: don't cache stale data.
+            if gen is not None and gen != self.gens.get(key, 0): return
+            self.data[key] = (time.time(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize: self.data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+            self.gens[key] = self.gens.get(key, 0) + 1
+
+# --- KEY -> ROW INDEX (first column of keyed sheets) ---
+class RowIndex:
+    def __init__(self):
+        self.rows = {}
+        self.size = None    # last used sheet row, None until built
+        self.lock = threading.RLock()
+
+    def rebuild(self, keys):
+        with self.lock:
+            self.rows = {}
+            for i, k in enumerate(keys): self.rows.setdefault(str(k), i + 2)
+            self.size = len(keys) + 1
+
+    def row(self, key):
+        with self.lock: return self.rows.get(str(key))
+
+    def place(self, keys, first_row):
+        with self.lock:
+            for i, k in enumerate(keys): self.rows.setdefault(str(k), first_row + i)
+            self.size = max(self.size or 0, first_row + len(keys) - 1)
+
+    def appended(self, keys):
+        with self.lock:
+            if self.size is not None: self.place(keys, self.size + 1)
+
+    def deleted(self, row):
+        with self.lock:
+            self.rows = {k: (r - 1 if r > row else r) for k, r in self.rows.items() if r != row}
+            if self.size is not None: self.size -= 1
+
+    def reset(self):
+        with self.lock: self.rows, self.size = {}, None
+
+# --- WRITE-BEHIND APPEND QUEUE ---
+class WriteQueue:
+    def __init__(self, writer):
+        self.writer = writer        # writer(sheet_name, rows) -> one append_rows call
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stats = {"flushed": 0, "calls": 0, "failures": 0, "last_flush": None, "last_error": None}
+        self.dead = deque(maxlen=DEAD_LETTER_MAX)     # {"sheet", "row", "error", "at"} for rejected rows
+        self.backoff = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, sheet_name, row):
+        with self.lock: self.pending.setdefault(sheet_name, []).append(list(row))
+        self.wake.set()
+
+    def rows(self, sheet_name):
+        with self.lock: return list(self.pending.get(sheet_name, []))
+
+    def size(self):
+        with self.lock: return sum(len(r) for r in self.pending.values())
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(FLUSH_DELAY + self.backoff)
+            self.wake.clear()
+            if not self.flush(): self.wake.set()
+
+    def flush(self, sheet_name=None):
+        ok = True
+        with self.flush_lock:
+            with self.lock: names = [sheet_name] if sheet_name else list(self.pending)
+            for name in names:
+                with self.lock: batch = list(self.pending.get(name, []))
+                if not batch: continue
+                parked = len(self.dead)
+                done, error = self.send(name, batch)
+                if done:
+                    with self.lock:
+                        rest = self.pending.get(name, [])[done:]
+                        if rest: self.pending[name] = rest
+                        else: self.pending.pop(name, None)
+                    self.stats["flushed"] += done - (len(self.dead) - parked); self.stats["calls"] += 1
+                    self.stats["last_flush"] = datetime.now().strftime("%H:%M:%S")
+                if error:
+                    ok = False
+                    metrics().record("flush", error=error)
+                    self.stats["failures"] += 1; self.stats["last_error"] = f"{name}: {error}"
+        self.backoff = 0 if ok else min(max(1, self.backoff * 2), FLUSH_MAX_BACKOFF)
+        return ok
+
+    def send(self, name, batch):
+        # (rows taken off the queue, error to retry on). Rows Sheets rejects outright are parked in
+        # self.dead instead of blocking everything queued behind them; 429s, 5xx and timeouts retry.
+        try:
+            self.writer(name, batch); return len(batch), None
+        except Exception as e:
+            if not rejected(e): return 0, e
+            metrics().record("flush.rejected", error=e)
+            if len(batch) == 1:
+                self.dead.append({"sheet": name, "row": batch[0], "error": str(e), "at": datetime.now().strftime("%H:%M:%S")})
+                return 1, None
+        done = 0
+        for row in batch:   # find the bad row(s): the rest of the batch still goes in
+            n, error = self.send(name, [row])
+            done += n
+            if error: return done, error
+        return done, None
+
+# --- MATERIALIZED MONTHLY ROLLUPS ---
+def month_key(dates):
+    # "YYYY-MM" per row; ISO dates (what the forms write) are sliced, anything else is parsed.
+    if pd.api.types.is_datetime64_any_dtype(dates): return dates.dt.strftime("%Y-%m").fillna("")
+    s = dates.astype(str)
+    iso = s.str.match(r"\d{4}-\d{2}")
+    if iso.all(): return s.str[:7]
+    parsed = pd.to_datetime(s.where(~iso), errors="coerce").dt.strftime("%Y-%m")
+    return s.str[:7].where(iso, parsed).fillna("")
+
+def month_label(key):
+    try: return datetime.strptime(key, "%Y-%m").strftime("%B %Y")
+    except: return key
+
+class MonthlyRollup:
+    def __init__(self, dims=("user", "category"), date_col="date", value_col="amount"):
+        self.dims, self.date_col, self.value_col = list(dims), date_col, value_col
+        self.totals = {}    # (user, category, month) -> [amount, rows]
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def group(self, df):
+        if df is None or df.empty or not set(self.dims + [self.date_col, self.value_col]) <= set(df.columns): return {}
+        g = pd.DataFrame({d: df[d].astype(str) for d in self.dims})
+        g["month"] = month_key(df[self.date_col])
+        g["amount"] = pd.to_numeric(df[self.value_col], errors="coerce").fillna(0)
+        agg = g.groupby(self.dims + ["month"])["amount"].agg(["sum", "count"])
+        return {k: [s, c] for k, s, c in zip(agg.index, agg["sum"], agg["count"])}
+
+    def reset(self, df):
+        totals = self.group(df)
+        with self.lock: self.totals, self.ready = totals, True
+
+    def apply(self, df, sign=1):
+        delta = self.group(df)
+        with self.lock:
+            for k, (s, c) in delta.items():
+                t = self.totals.setdefault(k, [0, 0])
+                t[0] += sign * s; t[1] += sign * c
+                if t[1] <= 0: del self.totals[k]
+
+    def frame(self, extra=None, **where):
+        with self.lock: totals = {k: list(v) for k, v in self.totals.items()}
+        for k, (s, c) in self.group(extra).items():
+            t = totals.setdefault(k, [0, 0]); t[0] += s; t[1] += c
+        df = pd.DataFrame([(*k, s, c) for k, (s, c) in totals.items()], columns=self.dims + ["month", "amount", "count"])
+        for col, val in where.items(): df = df[df[col] == str(val)]
+        return df.sort_values(["month"] + self.dims, ignore_index=True)
+
+def sql_cols(cols): return ", ".join(f'"{c}"' for c in cols)
+
+def key_column(sheet_name):
+    return KEY_COLUMNS.get(sheet_name)
+
+def pad_rows(rows, cols):
+    return pd.DataFrame([(list(r) + [""] * len(cols))[:len(cols)] for r in rows], columns=cols)
+
+# --- TYPED SCHEMA (applied once when a sheet is loaded) ---
+def apply_schema(sheet_name, df, first_row=2):
+    # Returns (typed frame, [{"row", "column", "value"}] for cells that didn't convert).
+    issues = []
+    if df.empty: return df, issues
+    df = df.copy()
+    for col, kind in SCHEMAS.get(sheet_name, {}).items():
+        if col not in df.columns: continue
+        raw = df[col]
+        blank = raw.isna() | (raw.astype(str).str.strip() == "")
+        if kind == "num": typed = pd.to_numeric(raw.where(~blank), errors="coerce")
+        elif kind == "date":
+            typed = pd.to_datetime(raw.where(~blank), errors="coerce", format="%Y-%m-%d")
+            if typed.isna().sum() > blank.sum():
+                typed = typed.fillna(pd.to_datetime(raw.where(~blank & typed.isna()), errors="coerce", format="mixed"))
+        elif kind == "cat": typed = raw.where(~blank, "").astype(str).astype("category")
+        else: typed = raw.where(~blank, "").astype(str)
+        if kind in ("num", "date"):
+            for pos in (typed.isna() & ~blank).to_numpy().nonzero()[0]:
+                issues.append({"row": first_row + int(pos), "column": col, "value": str(raw.iat[pos])})
+        df[col] = typed
+    return df, sorted(issues, key=lambda i: i["row"])
+
+def concat_typed(a, b):
+    # pd.concat turns categoricals with different categories into object; keep them categorical.
+    df = pd.concat([a, b], ignore_index=True)
+    for col in a.columns:
+        if isinstance(a[col].dtype, pd.CategoricalDtype) and col in b.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = union_categoricals([a[col], b[col].astype(str).astype("category")], ignore_order=True)
+    return df
+
+def set_cell(frame, pos, col_index, value):
+    col = frame.columns[col_index]
+    s = frame[col]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        value = str(value)
+        if value not in s.cat.categories: frame[col] = s.cat.add_categories([value])
+    elif pd.api.types.is_datetime64_any_dtype(s): value = pd.to_datetime(value, errors="coerce")
+    elif pd.api.types.is_numeric_dtype(s):
+        value = pd.to_numeric(value, errors="coerce")
+        if pd.api.types.is_integer_dtype(s) and not float(value).is_integer(): frame[col] = s.astype(float)
+    frame.iat[pos, col_index] = value
+
+def cell_key(v):
+    # Type-insensitive form of a cell, so a typed frame row can be compared with raw sheet values.
+    if v is None or v is pd.NaT or (isinstance(v, float) and v != v): return ""
+    if isinstance(v, (pd.Timestamp, datetime)): return v.strftime("%Y-%m-%d")
+    try: return repr(float(v))
+    except: return str(v)
+
+def fingerprint(values): return [cell_key(v) for v in values]
+
+# --- ON-DISK SNAPSHOTS (warm restarts, outage tolerance) ---
+SNAPSHOT_FORMAT = 1     # bump when the snapshot layout changes; older files are then ignored
+
+def credentials_only(df):
+    # Users snapshots keep login fields only, and only salted hashes: legacy plaintext passwords
+    # are blanked (those accounts sign in once Sheets is reachable, which upgrades them).
+    df = df[[c for c in SCHEMAS["Users"] if c in df.columns]].copy()
+    if "password" in df.columns: df["password"] = df["password"].where(df["password"].astype(str).str.startswith("pbkdf2_sha256$"), "")
+    return df
+
+SNAPSHOT_REDACT = {"Users": credentials_only}   # sheet -> frame filter applied before writing
+
+class SnapshotStore:
+    # One Parquet file per sheet, with the sync state (row count, tail fingerprint) and the
+    # schema it was typed with stamped into the file metadata. Writes happen off-thread.
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(max_workers=1)
+
+    def file(self, sheet_name): return os.path.join(self.path, f"{sheet_name}.parquet")
+
+    def load(self, sheet_name):
+        # (frame, meta), or None when there is no usable snapshot.
+        try:
+            import pyarrow.parquet as pq
+            table = pq.read_table(self.file(sheet_name))
+            meta = json.loads(table.schema.metadata[b"luxora"])
+            if sheet_name in SNAPSHOT_REDACT and not meta.get("redacted"):
+                os.remove(self.file(sheet_name)); return None    # written before redaction: may hold plaintext
+            if meta["format"] != SNAPSHOT_FORMAT or meta["schema"] != SCHEMAS.get(sheet_name): return None
+            return table.to_pandas(), meta
+        except FileNotFoundError: return None
+        except Exception as e:
+            metrics().record("snapshot.load", error=e); return None
+
+    def save_later(self, sheet_name, state):
+        # state() is called when the write runs, so a burst of changes is saved once.
+        with self.lock:
+            if sheet_name in self.dirty: return
+            self.dirty.add(sheet_name)
+        self.writer.submit(self.write, sheet_name, state)
+
+    def write(self, sheet_name, state):
+        start, error = time.perf_counter(), None
+        try:
+            import pyarrow as pa, pyarrow.parquet as pq
+            with self.lock: self.dirty.discard(sheet_name)
+            frame, meta = state()
+            if frame is None or meta is None: return
+            if sheet_name in SNAPSHOT_REDACT:   # the tail fingerprint and issues carry raw cell values too
+                frame, meta = SNAPSHOT_REDACT[sheet_name](frame), {**meta, "tail": None, "issues": [], "redacted": True}
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            meta = {**meta, "format": SNAPSHOT_FORMAT, "schema": SCHEMAS.get(sheet_name), "saved_at": time.time()}
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"luxora": json.dumps(meta, default=str).encode()})
+            tmp = self.file(sheet_name) + ".tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, self.file(sheet_name))
+        except Exception as e: error = e
+        finally: metrics().record("snapshot.write", (time.perf_counter() - start) * 1000, error)
+
+    def info(self):
+        rows = []
+        for name in SHEET_HEADERS:
+            try:
+                import pyarrow.parquet as pq
+                md = pq.read_metadata(self.file(name))
+                meta = json.loads(md.metadata[b"luxora"])
+                rows.append({"sheet": name, "rows": md.num_rows, "saved": datetime.fromtimestamp(meta["saved_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+                             "size_kb": round(os.path.getsize(self.file(name)) / 1024, 1)})
+            except: pass
+        return rows
+
+# --- BACKEND: GOOGLE SHEETS ---
+class SheetsStorage:
+    name = "Google Sheets"
+
+    def __init__(self, snapshot_dir=None):
+        self.cache = TTLCache(CACHE_TTL, CACHE_SIZE)
+        self.handles = {}
+        self.indexes = {}
+        self.frames = {}        # last full/merged frame per sheet, kept past TTL for delta sync
+        self.synced = {}        # sheet -> {"rows", "tail", "cols", "full_at"}
+        self.issues = {}        # sheet -> cells that failed schema conversion
+        self.sync_locks = {}
+        self.degraded = {}      # sheet -> error while we serve its last loaded frame
+        self.unverified = set() # sheets served from a snapshot / last known copy, not yet re-synced
+        self.revalidating = set()
+        self.unconfirmed = {}   # sheet -> rows of an append that failed without a clear answer
+        self.writes = 0         # Sheets writes this process made (see remote); tells our edits from outside ones
+        self.rollups = {n: MonthlyRollup() for n in ROLLUP_SHEETS}
+        self.snapshots = None
+        if snapshot_dir:
+            try: self.snapshots = SnapshotStore(snapshot_dir)
+            except Exception as e: metrics().record("snapshot.open", error=e)
+        self.queue = WriteQueue(self.append_rows)
+
+    def remote(self, kind, fn, *args, **kwargs):
+        # Every Sheets API request goes through the shared client: rate limited, retried,
+        # identical reads coalesced, and counted against the quota window.
+        result = sheets_client().call(kind, fn, *args, **kwargs)
+        if kind == "write": self.writes += 1
+        return result
+
+    def worksheet(self, sheet_name):
+        if sheet_name not in self.handles: self.handles[sheet_name] = self.remote("read", connect_db().worksheet, sheet_name)
+        return self.handles[sheet_name]
+
+    def ensure_headers(self, ws, headers):
+        try:
+            first = self.remote("read", ws.row_values, 1)
+            if not first: self.remote("write", ws.append_row, headers)
+            elif first[0] != headers[0]: self.remote("write", ws.insert_row, headers, index=1)
+            elif len(first) < len(headers) and first == headers[:len(first)]: self.remote("write", ws.update, [headers], "A1")   # new columns
+        except: pass
+
+    def row_index(self, sheet_name):
+        return self.indexes.setdefault(sheet_name, RowIndex())
+
+    def find_rows(self, sheet_name, ids):
+        # Index lookups, checked against the key cells on the sheet in one read: another client may
+        # have inserted or deleted rows since the index was built. A miss or mismatch rebuilds it.
+        idx = self.row_index(sheet_name)
+        rows = [idx.row(i) for i in ids]
+        if None not in rows:
+            got = self.remote("read", connect_db().values_batch_get, [f"'{sheet_name}'!A{r}:A{r}" for r in rows]).get("valueRanges", [])
+            keys = [((v.get("values") or [[""]])[0] or [""])[0] for v in got]
+            if [cell_key(k) for k in keys] == [cell_key(i) for i in ids]: return rows
+        idx.rebuild(self.remote("read", self.worksheet(sheet_name).col_values, 1)[1:])
+        rows = [idx.row(i) for i in ids]
+        if None in rows: raise KeyError(ids[rows.index(None)])
+        return rows
+
+    def find_row(self, sheet_name, id_val): return self.find_rows(sheet_name, [id_val])[0]
+
+    def load(self, sheet_name, stamp=None):
+        ws = self.worksheet(sheet_name)
+        if sheet_name in SHEET_HEADERS: self.ensure_headers(ws, SHEET_HEADERS[sheet_name])
+        return self.install(sheet_name, self.remote("read", ws.get_all_records), stamp)
+
+    def install(self, sheet_name, records, stamp=None):
+        # stamp: {"version", "writes"} as they were before records was read (see sync).
+        df, self.issues[sheet_name] = apply_schema(sheet_name, pd.DataFrame(records))
+        key = key_column(sheet_name)
+        if key in df.columns: self.row_index(sheet_name).rebuild(df[key].tolist())
+        self.synced[sheet_name] = {"rows": len(records), "tail": fingerprint(records[-1].values()) if records else None,
+                                   "cols": list(df.columns), "full_at": time.time(), **(stamp or {})}
+        if sheet_name in self.rollups: self.rollups[sheet_name].reset(df)
+        self.frames[sheet_name] = df
+        self.persist(sheet_name)
+        return df
+
+    def persist(self, sheet_name):
+        if self.snapshots:
+            self.snapshots.save_later(sheet_name, lambda: (self.frames.get(sheet_name), self.synced.get(sheet_name) and
+                                                           {**self.synced[sheet_name], "issues": self.issues.get(sheet_name, [])}))
+
+    def restore(self, sheet_name):
+        # Cold start: take the sheet from its on-disk snapshot, to be re-synced in the background.
+        snap = self.snapshots.load(sheet_name) if self.snapshots else None
+        if snap is None: return False
+        df, meta = snap
+        key = key_column(sheet_name)
+        if key in df.columns: self.row_index(sheet_name).rebuild(df[key].tolist())
+        # Nothing written by this process yet, so a newer modified time means the snapshot is behind.
+        self.synced[sheet_name] = {**{k: meta[k] for k in ("rows", "tail", "cols", "full_at")}, "version": meta.get("version"), "writes": self.writes}
+        self.issues[sheet_name] = meta.get("issues", [])
+        if sheet_name in self.rollups: self.rollups[sheet_name].reset(df)
+        self.frames[sheet_name] = df
+        self.unverified.add(sheet_name)
         return True
-    except: return False
 
-def update_cell_value(sheet_name, id_val, col_index, new_value):
-    try:
-        ws = connect_db().worksheet(sheet_name)
-        cell = ws.find(str(id_val))
-        ws.update_cell(cell.row, col_index, new_value)
+    def revalidate(self, sheet_name):
+        # Re-sync a sheet served from a snapshot or last known copy. False if the remote failed.
+        try:
+            with self.sync_locks.setdefault(sheet_name, threading.Lock()):
+                if sheet_name not in self.unverified: return True
+                gen = self.cache.generation(sheet_name)
+                df = self.sync(sheet_name)
+                self.cache.put(sheet_name, df, gen)     # replaces the served copy unless a write landed meanwhile
+                self.unverified.discard(sheet_name)
+                self.degraded.pop(sheet_name, None)
+            return True
+        except Exception as e:
+            metrics().record(f"revalidate.{sheet_name}", error=e)
+            self.degraded[sheet_name] = f"{type(e).__name__}: {e}"
+            return False
+        finally: self.revalidating.discard(sheet_name)
+
+    def revalidate_later(self, sheet_name):
+        if sheet_name in self.revalidating: return
+        self.revalidating.add(sheet_name)
+        threading.Thread(target=self.revalidate, args=(sheet_name,), daemon=True).start()
+
+    def verify(self, sheet_name):
+        # Row numbers taken from a snapshot may be out of date: writes re-sync first.
+        if sheet_name in self.unverified and not self.revalidate(sheet_name):
+            raise RuntimeError(f"{sheet_name} could not be re-synced: {self.degraded.get(sheet_name)}")
+
+    def version(self):
+        # Drive's modifiedTime for the whole spreadsheet, None if it can't be read.
+        try: return self.remote("read", connect_db().get_lastUpdateTime)
+        except Exception as e:
+            metrics().record("sheets.version", error=e); return None
+
+    def sync(self, sheet_name):
+        # Append-only sheets: re-read from the last known row down. If that row no longer
+        # matches, something above it was deleted or edited and we fall back to a full load.
+        # The spreadsheet's modified time catches edits above the tail too, but only while this
+        # process hasn't written since the last sync (it can't say which sheet changed); when it
+        # has, an outside edit above the tail waits for FULL_SYNC_EVERY.
+        if sheet_name not in APPEND_ONLY: return self.load(sheet_name)
+        stamp = {"writes": self.writes, "version": self.version()}
+        state, frame = self.synced.get(sheet_name), self.frames.get(sheet_name)
+        known = bool(state and state.get("version") and stamp["version"])
+        quiet = bool(state) and state.get("writes") == stamp["writes"]
+        outside = known and quiet and stamp["version"] != state["version"]
+        if (frame is None or state is None or not state["rows"] or outside
+                or time.time() - state["full_at"] > FULL_SYNC_EVERY):
+            if outside: metrics().record("sync.outside_edit")
+            return self.load(sheet_name, stamp)
+        if known and quiet: return frame       # nothing in the spreadsheet has changed
+        n, cols = state["rows"], state["cols"]
+        from gspread.utils import rowcol_to_a1, numericise_all
+        fetched = self.remote("read", self.worksheet(sheet_name).get, f"A{n + 1}:{rowcol_to_a1(1, len(cols))[:-1]}")
+        rows = [numericise_all((list(r) + [""] * len(cols))[:len(cols)]) for r in fetched]
+        if not rows or fingerprint(rows[0]) != state["tail"]: return self.load(sheet_name, stamp)
+        new = rows[1:]
+        if not new:
+            state.update(stamp); return frame
+        added, issues = apply_schema(sheet_name, pd.DataFrame(new, columns=cols), first_row=n + 2)
+        self.issues[sheet_name] = self.issues.get(sheet_name, []) + issues
+        if sheet_name in self.rollups: self.rollups[sheet_name].apply(added)
+        df = concat_typed(frame, added)
+        key = key_column(sheet_name)
+        if key in cols: self.row_index(sheet_name).place([r[cols.index(key)] for r in new], n + 2)
+        state.update(rows=n + len(new), tail=fingerprint(new[-1]), **stamp)
+        self.frames[sheet_name] = df
+        self.persist(sheet_name)
+        return df
+
+    def current(self, sheet_name):
+        # The shared, synced frame (not a copy, no pending rows). Raises on remote failure.
+        df = self.cache.get(sheet_name)
+        metrics().record(f"cache.{sheet_name}", hit=df is not None)
+        if df is None:
+            with self.sync_locks.setdefault(sheet_name, threading.Lock()):
+                df = self.cache.get(sheet_name)     # another session may have just synced it
+                if df is None:
+                    gen = self.cache.generation(sheet_name)
+                    if sheet_name not in self.frames: self.restore(sheet_name)
+                    if sheet_name in self.unverified:
+                        # Stale-while-revalidate: this render gets the copy we have, not Sheets' latency.
+                        df = self.frames[sheet_name]
+                        self.revalidate_later(sheet_name)
+                    else:
+                        df = self.sync(sheet_name)
+                        self.degraded.pop(sheet_name, None)
+                    self.cache.put(sheet_name, df, gen)
+        return df
+
+    def read(self, sheet_name):
+        try: df = self.current(sheet_name)
+        except Exception as e:
+            metrics().record(f"read.{sheet_name}", error=e)
+            # Quota or outage: keep showing what we last had rather than an empty page.
+            df = self.frames.get(sheet_name)
+            if df is None: return pd.DataFrame()
+            self.degraded[sheet_name] = f"{type(e).__name__}: {e}"
+            self.unverified.add(sheet_name)     # later reads retry in the background
+            self.cache.put(sheet_name, df)      # back off this sheet for a TTL instead of retrying every read
+        pending = self.queue.rows(sheet_name)
+        if pending and sheet_name in SHEET_HEADERS:
+            # Rows still waiting in the write-behind queue are shown as if already saved.
+            return concat_typed(df, apply_schema(sheet_name, pad_rows(pending, SHEET_HEADERS[sheet_name]))[0])
+        return df.copy()
+
+    def prefetch(self, sheet_names):
+        # Cold sheets come down together in one values_batch_get; sheets that only need
+        # a delta sync are refreshed on a small thread pool. Sheets restored from disk are
+        # served at once and re-downloaded together in the background.
+        stale = [n for n in sheet_names if self.cache.get(n) is None]
+        restored = [n for n in stale if n not in self.frames and self.restore(n)]
+        if restored:
+            for n in restored: self.cache.put(n, self.frames[n])
+            self.revalidating.update(restored)
+            threading.Thread(target=self.batch_load, args=(restored, True), daemon=True).start()
+        cold = [n for n in stale if n not in self.frames]
+        if cold: self.batch_load(cold)
+        rest = [n for n in stale if self.cache.get(n) is None]
+        if rest:
+            with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as pool: list(pool.map(self.read, rest))
+
+    def batch_load(self, names, revalidating=False):
+        try:
+            from gspread.utils import numericise_all
+            gens = {n: self.cache.generation(n) for n in names}
+            stamp = {"writes": self.writes, "version": self.version()} if APPEND_ONLY & set(names) else None
+            ranges = self.remote("read", connect_db().values_batch_get, [f"'{n}'" for n in names]).get("valueRanges", [])
+            for name, vr in zip(names, ranges):
+                values = vr.get("values", [])
+                header = SHEET_HEADERS.get(name)
+                if not values or (header and values[0][:len(header)] != header): continue   # let read() fix headers
+                cols = values[0]
+                records = [dict(zip(cols, numericise_all((list(r) + [""] * len(cols))[:len(cols)]))) for r in values[1:]]
+                with self.sync_locks.setdefault(name, threading.Lock()):
+                    self.cache.put(name, self.install(name, records, stamp if name in APPEND_ONLY else None), gens[name])
+                    self.unverified.discard(name); self.degraded.pop(name, None)
+        except Exception as e:
+            metrics().record("prefetch", error=e)
+            if revalidating:
+                for n in names: self.degraded[n] = f"{type(e).__name__}: {e}"
+        finally:
+            if revalidating: self.revalidating.difference_update(names)
+
+    def query(self, sheet_name, **where):
+        df = self.read(sheet_name)
+        for col, val in where.items():
+            if df.empty: break
+            df = df[df[col] == val] if col in df.columns else df.iloc[0:0]
+        return df
+
+    def schema_issues(self, sheet_name):
+        return list(self.issues.get(sheet_name, []))
+
+    def monthly(self, sheet_name, **where):
+        rollup = self.rollups[sheet_name]
+        try: self.current(sheet_name)
+        except: pass
+        pending = self.queue.rows(sheet_name)
+        return rollup.frame(pad_rows(pending, SHEET_HEADERS[sheet_name]) if pending else None, **where)
+
+    def append_rows(self, sheet_name, rows):
+        self.verify(sheet_name)
+        idx = self.row_index(sheet_name)
+        with idx.lock:
+            # Rows from an append we never got an answer for may already be on the sheet.
+            sent = self.unconfirmed.get(sheet_name)
+            if sent and rows[:len(sent)] == sent and self.landed(sheet_name, sent):
+                metrics().record("append.landed", hit=True); self.writes += 1
+                self.cache.invalidate(sheet_name); rows = rows[len(sent):]
+            self.unconfirmed.pop(sheet_name, None)
+            if not rows: return
+            try:
+                self.remote("write", self.worksheet(sheet_name).append_rows, rows)
+                if key_column(sheet_name): idx.appended([r[0] for r in rows])
+                self.cache.invalidate(sheet_name)
+            except Exception as e:
+                status = api_status(e)
+                if not (status and 400 <= status < 500):
+                    # Timeouts and 5xx don't say whether the rows were written: look before retrying.
+                    self.unconfirmed[sheet_name] = rows
+                    try:
+                        if self.landed(sheet_name, rows):
+                            self.unconfirmed.pop(sheet_name, None); self.writes += 1
+                            metrics().record("append.landed", hit=True)
+                            self.cache.invalidate(sheet_name); return
+                    except: pass
+                idx.reset(); self.stale(sheet_name); raise
+
+    def landed(self, sheet_name, rows):
+        # Keyed sheets look for the batch's ids in column A; others compare the sheet's last rows.
+        ws = self.worksheet(sheet_name)
+        if key_column(sheet_name):
+            keys = self.remote("read", ws.col_values, 1)[1:]
+            self.row_index(sheet_name).rebuild(keys)
+            return {str(r[0]) for r in rows} <= {str(k) for k in keys}
+        tail = self.remote("read", ws.get_all_values)[1:][-len(rows):]
+        return len(tail) == len(rows) and all(fingerprint((t + [""] * len(r))[:len(r)]) == fingerprint(r) for t, r in zip(tail, rows))
+
+    def stale(self, sheet_name):
+        # We can't tell what changed: drop the sync state so the next read is a full load
+        # (the frame stays as a fallback if that load fails).
+        self.synced.pop(sheet_name, None)
+        self.cache.invalidate(sheet_name)
+
+    def patch(self, sheet_name, edit):
+        # Mirror an in-app edit into the held frame (and rollup) instead of re-downloading.
+        frame, state = self.frames.get(sheet_name), self.synced.get(sheet_name)
+        try:
+            if frame is None or state is None: raise KeyError(sheet_name)
+            frame = edit(frame.copy())
+            state.update(rows=len(frame), tail=fingerprint(frame.iloc[-1].tolist()) if len(frame) else None)
+            self.frames[sheet_name] = frame
+            self.cache.invalidate(sheet_name)
+            self.cache.put(sheet_name, frame)
+            self.persist(sheet_name)
+        except: self.stale(sheet_name)
+
+    def check_key(self, sheet_name, frame, pos, id_val):
+        key = key_column(sheet_name)
+        if key and str(frame.iat[pos, frame.columns.get_loc(key)]) != str(id_val): raise KeyError(id_val)
+
+    def add(self, sheet_name, row_data):
+        self.queue.put(sheet_name, row_data)
+        return True
+
+    def flush(self, sheet_name=None):
+        return self.queue.flush(sheet_name)
+
+    def add_many(self, sheet_name, rows):
+        # One append_rows call, outside the write-behind queue so bulk imports can report progress.
+        try:
+            self.queue.flush(sheet_name)
+            self.append_rows(sheet_name, [list(r) for r in rows])
+            return True
+        except Exception as e:
+            metrics().record("add_many", error=e); return False
+
+    def chunks(self, sheet_name, size, **where):
+        # Slices of the shared frame (views, not copies) for streaming exports.
+        self.queue.flush(sheet_name)
+        try: df = self.current(sheet_name)
+        except: df = self.frames.get(sheet_name, pd.DataFrame())
+        for col, val in where.items(): df = df[df[col] == val] if col in df.columns else df.iloc[0:0]
+        for start in range(0, len(df), size): yield df.iloc[start:start + size]
+
+    @contextmanager
+    def editing(self, sheet_name):
+        # Re-sync and push queued rows first, then hold the sheet's sync lock across the remote edit
+        # and the frame patch, so a delta sync running meanwhile can't put back the pre-edit frame.
+        self.verify(sheet_name)
+        self.flush(sheet_name)
+        with self.sync_locks.setdefault(sheet_name, threading.Lock()): yield
+
+    def delete(self, sheet_name, col_name, id_val):
+        def drop(frame):
+            pos = row - 2
+            if col_name == key_column(sheet_name): self.check_key(sheet_name, frame, pos, id_val)
+            if sheet_name in self.rollups: self.rollups[sheet_name].apply(frame.iloc[[pos]], -1)
+            return frame.drop(frame.index[pos]).reset_index(drop=True)
+        try:
+            with self.editing(sheet_name):
+                ws = self.worksheet(sheet_name)
+                idx = self.row_index(sheet_name)
+                with idx.lock:
+                    row = self.find_row(sheet_name, id_val) if col_name == key_column(sheet_name) else self.remote("read", ws.find, str(id_val)).row
+                    self.remote("write", ws.delete_rows, row)
+                    idx.deleted(row)
+                self.patch(sheet_name, drop)
+        except Exception as e:
+            metrics().record("delete", error=e); self.stale(sheet_name); return False
+        return True
+
+    def update(self, sheet_name, updates):
+        # updates: [(id, col_index, value), ...] -> a single update_cell/batch_update call
+        def edit(frame):
+            for (r, c, v), (id_val, _, _) in zip(cells, updates): self.check_key(sheet_name, frame, r - 2, id_val)
+            touched = sorted({r - 2 for r, _, _ in cells})
+            before = frame.iloc[touched]
+            for r, c, v in cells: set_cell(frame, r - 2, c - 1, v)
+            if sheet_name in self.rollups:
+                self.rollups[sheet_name].apply(before, -1); self.rollups[sheet_name].apply(frame.iloc[touched])
+            return frame
+        try:
+            with self.editing(sheet_name):
+                ws = self.worksheet(sheet_name)
+                from gspread.utils import rowcol_to_a1
+                ids = [i for i, _, _ in updates]
+                rows = self.find_rows(sheet_name, ids) if key_column(sheet_name) else [self.remote("read", ws.find, str(i)).row for i in ids]
+                cells = [(r, c, v) for r, (_, c, v) in zip(rows, updates)]
+                if len(cells) == 1: self.remote("write", ws.update_cell, *cells[0])
+                else: self.remote("write", ws.batch_update, [{"range": rowcol_to_a1(r, c), "values": [[v]]} for r, c, v in cells])
+                self.patch(sheet_name, edit)
+        except Exception as e:
+            metrics().record("update", error=e); self.stale(sheet_name); return False
+        return True
+
+# --- BACKEND: LOCAL SQLITE (offline / testing) ---
+class SQLiteStorage:
+    name = "SQLite"
+    queue = None
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.rollups = {n: MonthlyRollup() for n in ROLLUP_SHEETS}
+        self.issues = {}
+        with self.lock, self.conn:
+            for sheet_name, cols in SHEET_HEADERS.items():
+                # Untyped columns keep Sheets' loose typing: numbers stay numbers, text stays text.
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{sheet_name}" ({sql_cols(cols)})')
+                have = {r[1] for r in self.conn.execute(f'PRAGMA table_info("{sheet_name}")')}
+                for col in cols:
+                    if col not in have: self.conn.execute(f'ALTER TABLE "{sheet_name}" ADD COLUMN "{col}" DEFAULT \'\'')
+                for col in {key_column(sheet_name), "user"} & set(cols):
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{sheet_name}_{col}" ON "{sheet_name}" ("{col}")')
+
+    def columns(self, sheet_name):
+        if sheet_name not in SHEET_HEADERS: raise KeyError(sheet_name)
+        return SHEET_HEADERS[sheet_name]
+
+    def query(self, sheet_name, **where):
+        try:
+            cols = self.columns(sheet_name)
+            sql = f'SELECT {sql_cols(cols)} FROM "{sheet_name}"'
+            if where: sql += " WHERE " + " AND ".join(f'"{c}" = ?' for c in where)
+            with self.lock: df = pd.read_sql_query(sql + " ORDER BY rowid", self.conn, params=list(where.values()))
+            df, issues = apply_schema(sheet_name, df)
+            if not where: self.issues[sheet_name] = issues
+            return df
+        except Exception as e:
+            metrics().record(f"read.{sheet_name}", error=e); return pd.DataFrame()
+
+    def schema_issues(self, sheet_name):
+        return list(self.issues.get(sheet_name, []))
+
+    def read(self, sheet_name):
+        return self.query(sheet_name)
+
+    def monthly(self, sheet_name, **where):
+        rollup = self.rollups[sheet_name]
+        if not rollup.ready: rollup.reset(self.read(sheet_name))
+        return rollup.frame(**where)
+
+    def rolled(self, sheet_name, rows, sign=1):
+        rollup = self.rollups.get(sheet_name)
+        if rollup and rollup.ready: rollup.apply(rows, sign)
+
+    def add(self, sheet_name, row_data):
+        try:
+            cols = self.columns(sheet_name)
+            row = (list(row_data) + [""] * len(cols))[:len(cols)]
+            with self.lock, self.conn: self.conn.execute(f'INSERT INTO "{sheet_name}" VALUES ({", ".join("?" * len(cols))})', row)
+            self.rolled(sheet_name, pad_rows([row], cols))
+            return True
+        except Exception as e:
+            metrics().record("sqlite", error=e); return False
+
+    def flush(self, sheet_name=None):
         return True
-    except: return False
+
+    def add_many(self, sheet_name, rows):
+        try:
+            cols = self.columns(sheet_name)
+            rows = [(list(r) + [""] * len(cols))[:len(cols)] for r in rows]
+            with self.lock, self.conn: self.conn.executemany(f'INSERT INTO "{sheet_name}" VALUES ({", ".join("?" * len(cols))})', rows)
+            self.rolled(sheet_name, pad_rows(rows, cols))
+            return True
+        except Exception as e:
+            metrics().record("sqlite", error=e); return False
+
+    def chunks(self, sheet_name, size, **where):
+        # Keyset pagination on rowid: the lock is only held while one chunk is read.
+        cols, last = self.columns(sheet_name), 0
+        cond = "".join(f' AND "{c}" = ?' for c in where)
+        while True:
+            with self.lock:
+                df = pd.read_sql_query(f'SELECT rowid AS _rowid, {sql_cols(cols)} FROM "{sheet_name}" WHERE rowid > ?{cond} ORDER BY rowid LIMIT ?',
+                                       self.conn, params=[last, *where.values(), size])
+            if df.empty: return
+            last = int(df["_rowid"].iat[-1])
+            yield apply_schema(sheet_name, df.drop(columns="_rowid"))[0]
+            if len(df) < size: return
+
+    def prefetch(self, sheet_names):
+        pass
+
+    def rowid(self, sheet_name, col_name, id_val):
+        hit = self.conn.execute(f'SELECT rowid FROM "{sheet_name}" WHERE "{col_name}" IN (?, ?) ORDER BY rowid LIMIT 1', (str(id_val), id_val)).fetchone()
+        if hit is None: raise KeyError(id_val)
+        return hit[0]
+
+    def fetch(self, sheet_name, rowids):
+        marks = ", ".join("?" * len(rowids))
+        return pd.read_sql_query(f'SELECT {sql_cols(self.columns(sheet_name))} FROM "{sheet_name}" WHERE rowid IN ({marks})', self.conn, params=list(rowids))
+
+    def delete(self, sheet_name, col_name, id_val):
+        try:
+            self.columns(sheet_name)
+            with self.lock, self.conn:
+                rowid = self.rowid(sheet_name, col_name, id_val)
+                old = self.fetch(sheet_name, [rowid])
+                self.conn.execute(f'DELETE FROM "{sheet_name}" WHERE rowid = ?', (rowid,))
+            self.rolled(sheet_name, old, -1)
+            return True
+        except Exception as e:
+            metrics().record("sqlite", error=e); return False
+
+    def update(self, sheet_name, updates):
+        try:
+            cols, key = self.columns(sheet_name), key_column(sheet_name) or self.columns(sheet_name)[0]
+            with self.lock, self.conn:
+                rowids = [self.rowid(sheet_name, key, id_val) for id_val, _, _ in updates]
+                before = self.fetch(sheet_name, rowids)
+                for rowid, (_, col_index, new_value) in zip(rowids, updates):
+                    self.conn.execute(f'UPDATE "{sheet_name}" SET "{cols[col_index - 1]}" = ? WHERE rowid = ?', (new_value, rowid))
+                after = self.fetch(sheet_name, rowids)
+            self.rolled(sheet_name, before, -1); self.rolled(sheet_name, after)
+            return True
+        except Exception as e:
+            metrics().record("sqlite", error=e); return False
+
+@st.cache_resource
+def storage():
+    if str(config("STORAGE_BACKEND", "sheets")).lower() == "sqlite":
+        return SQLiteStorage(config("SQLITE_PATH", "luxora.db"))
+    return SheetsStorage(config("SNAPSHOT_DIR", ".luxora_cache"))
+
+# --- APP-FACING HELPERS ---
+@instrumented("get_data")
+def get_data(sheet_name): return storage().read(sheet_name)
+
+def query_data(sheet_name, **where): return storage().query(sheet_name, **where)
+
+def monthly_totals(sheet_name, **where): return storage().monthly(sheet_name, **where)
+
+def report_schema_issues(sheet_name):
+    issues = storage().schema_issues(sheet_name)
+    if issues:
+        sample = ", ".join(f"row {i['row']} {i['column']}='{i['value']}'" for i in issues[:5])
+        st.warning(f"⚠️ {len(issues)} value(s) in {sheet_name} could not be read and were left blank: {sample}{' ...' if len(issues) > 5 else ''}")
+
+@instrumented("add_row")
+def add_row(sheet_name, row_data): return storage().add(sheet_name, row_data)
+
+def flush_writes(sheet_name=None): return storage().flush(sheet_name)
+
+def prefetch_for(user): storage().prefetch(ROLE_SHEETS.get(user.get('role'), ROLE_SHEETS["User"]))
+
+@instrumented("add_many")
+def add_rows(sheet_name, rows): return storage().add_many(sheet_name, rows)
+
+@instrumented("delete_row_by_id")
+def delete_row_by_id(sheet_name, col_name, id_val): return storage().delete(sheet_name, col_name, id_val)
+
+@instrumented("update_cell_value")
+def update_cell_value(sheet_name, id_val, col_index, new_value):
+    return storage().update(sheet_name, [(id_val, col_index, new_value)])
+
+def batch_update_cells(sheet_name, updates): return storage().update(sheet_name, updates)
 
 # ==========================================
 # 3. AI ENGINE
 # ==========================================
+AI_MODELS = ['gemini-1.5-flash', 'gemini-pro']
+AI_CACHE_TTL = 3600     # seconds an insight is reused for the same prompt
+AI_CACHE_SIZE = 256
+MODEL_COOLDOWN = 300    # seconds a failing model is skipped before it is tried again
+AI_DEADLINE = 30        # seconds a single insight may take, first token included
+
+def ai_outage(e):
+    # Network failures, timeouts, 429 and 5xx mean the model is unavailable; a safety block
+    # (ValueError from chunk.text) or a 4xx about the prompt is specific to that request.
+    status = api_status(e)
+    return isinstance(e, OSError) or type(e).__name__ == "RetryError" or (isinstance(status, int) and (status == 429 or status >= 500))
+
+@st.cache_resource
+def genai_config():
+    # genai.configure is process-wide: engines for different keys take turns under this lock.
+    return {"lock": threading.Lock(), "key": None}
+
 class EnterpriseAI:
     def __init__(self, api_key):
         self.active = False
-        if api_key:
+        self.key = (api_key or "").strip()
+        self.models = {}
+        self.down_until = {}
+        self.cache = TTLCache(AI_CACHE_TTL, AI_CACHE_SIZE)
+        if self.key:
             try:
-                genai.configure(api_key=api_key.strip())
+                with genai_config()["lock"]: self.configure()
                 self.active = True
             except: self.active = False
 
+    def configure(self):
+        # Caller holds genai_config()["lock"]. Another engine (e.g. a sidebar key) may have swapped the key.
+        state = genai_config()
+        if state["key"] != self.key:
+            import google.generativeai as genai
+            genai.configure(api_key=self.key)
+            state["key"] = self.key
+
+    def model(self, name):
+        # The model's client is built while this engine's key is configured and kept on the model,
+        # so requests need no lock and a later genai.configure (another key) doesn't affect them.
+        if name not in self.models:
+            import google.generativeai as genai
+            from google.generativeai import client
+            with genai_config()["lock"]:
+                self.configure()
+                model = genai.GenerativeModel(name)
+                model._client = client.get_default_generative_client()
+            self.models[name] = model
+        return self.models[name]
+
+    def healthy(self, name):
+        return time.time() >= self.down_until.get(name, 0)
+
+    def trip(self, name):
+        self.down_until[name] = time.time() + MODEL_COOLDOWN
+
     def get_insight(self, prompt):
-        if not self.active: return "⚠️ AI Services Unavailable."
-        models = ['gemini-1.5-flash', 'gemini-pro']
-        for m in models:
+        return "".join(self.stream_insight(prompt))
+
+    def stream_insight(self, prompt, deadline=AI_DEADLINE):
+        # Yields text as the model produces it. Closing the generator (e.g. a rerun) cancels it.
+        if not self.active: yield "⚠️ AI Services Unavailable."; return
+        key = " ".join(prompt.lower().split())
+        for m in AI_MODELS:
+            hit = self.cache.get((m, key))
+            if hit is not None:
+                metrics().record("get_insight", hit=True); yield hit; return
+        metrics().record("get_insight", hit=False)
+        start = time.perf_counter()
+        stop_at = time.time() + deadline
+        last = None
+        for m in AI_MODELS:
+            if not self.healthy(m): continue
+            parts, error = [], None
             try:
-                model = genai.GenerativeModel(m)
-                return model.generate_content(prompt).text
-            except: continue
-        return "⚠️ Service Error: AI models are currently unreachable."
+                response = self.model(m).generate_content(prompt, stream=True, request_options={"timeout": deadline})
+                for chunk in response:
+                    parts.append(chunk.text)
+                    yield parts[-1]
+                    if time.time() > stop_at: yield "\n\n⏱️ *Answer cut short: time limit reached.*"; return
+                self.cache.put((m, key), "".join(parts))
+                return
+            except GeneratorExit: raise
+            except Exception as e:
+                error = last = e
+                if ai_outage(e): self.trip(m)   # a blocked or rejected prompt leaves the model up for everyone else
+                if parts: return    # don't restart on another model mid-answer
+            finally: metrics().record("get_insight", (time.perf_counter() - start) * 1000, error, remote="ai")
+        if last is None or ai_outage(last): yield "⚠️ Service Error: AI models are currently unreachable."
+        else: yield "⚠️ The AI couldn't answer this prompt. Try rephrasing it."
+
+@st.cache_resource
+def ai_engine(api_key): return EnterpriseAI(api_key)
 
 # ==========================================
 # 4. AUTHENTICATION
@@ -166,7 +1306,96 @@ class EnterpriseAI:
 if 'user' not in st.session_state: st.session_state.user = None
 if 'xp' not in st.session_state: st.session_state.xp = 0
 
+PBKDF2_ROUNDS = 120_000
+CREDENTIAL_TTL = 300    # seconds before the credential index re-reads the Users sheet
+
+def hash_password(password, salt=None):
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", str(password).encode(), bytes.fromhex(salt), PBKDF2_ROUNDS).hex()
+    return f"pbkdf2_sha256${PBKDF2_ROUNDS}${salt}${digest}"
+
+def verify_password(password, stored):
+    stored = str(stored)
+    if not stored: return False     # no password on record (e.g. redacted in a snapshot)
+    if stored.startswith("pbkdf2_sha256$"):
+        _, rounds, salt, digest = stored.split("$")
+        check = hashlib.pbkdf2_hmac("sha256", str(password).encode(), bytes.fromhex(salt), int(rounds)).hex()
+        return hmac.compare_digest(check, digest)
+    return hmac.compare_digest(str(password).encode(), stored.encode())    # legacy plaintext row
+
+# --- USERNAME-KEYED CREDENTIAL INDEX (shared) ---
+class CredentialIndex:
+    def __init__(self):
+        self.users = {}
+        self.loaded_at = 0
+        self.provisional = False    # built from a saved copy of Users that hasn't been re-synced yet
+        self.lock = threading.Lock()
+        self.registering = threading.Lock()     # username check + append run as one step
+        self.dummy = hash_password("")     # verified against on unknown usernames to keep timing flat
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and not self.provisional and time.time() - self.loaded_at < CREDENTIAL_TTL: return
+            store = storage()
+            if force:
+                flush_writes("Users")
+                if hasattr(store, "verify"): store.verify("Users")     # never decide against a saved copy
+            df = get_data("Users")
+            self.provisional = "Users" in getattr(store, "unverified", set())
+            users = {}
+            for rec in df.to_dict("records"):
+                rec = {k: ("" if v is None else str(v)) for k, v in rec.items()}
+                users.setdefault(rec.get("username", ""), rec)
+            self.users, self.loaded_at = users, time.time()
+
+    def authenticate(self, username, password):
+        self.refresh()
+        rec = self.lookup(username, password)
+        if rec is None and self.provisional:
+            # A saved copy can miss recent sign-ups and has legacy passwords blanked: re-sync once,
+            # or in the background if the last attempt failed so an outage doesn't stall the login.
+            store = storage()
+            if "Users" in getattr(store, "degraded", {}) or "Users" in store.revalidating:
+                store.revalidate_later("Users")
+            else:
+                try: self.refresh(force=True)
+                except Exception as e: metrics().record("login", error=e)
+                else: rec = self.lookup(username, password)
+        if rec is None: return None
+        if not rec["password"].startswith("pbkdf2_sha256$"):
+            # Upgrade a legacy plaintext password to a salted hash on first successful login.
+            hashed = hash_password(password)
+            if update_cell_value("Users", username, 2, hashed): rec["password"] = hashed
+        return {k: v for k, v in rec.items() if k != "password"}
+
+    def lookup(self, username, password):
+        rec = self.users.get(str(username))
+        if rec is None:
+            verify_password(password, self.dummy); return None
+        return rec if verify_password(password, rec.get("password", "")) else None
+
+    def exists(self, username):
+        self.refresh(force=True)
+        return str(username) in self.users
+
+    def register(self, username, password, name, role="User"):
+        # True, False on a failed write, or "taken". Written straight to the sheet, not queued,
+        # so True means the account is saved.
+        with self.registering:
+            try:
+                if self.exists(username): return "taken"
+            except Exception as e:
+                metrics().record("register", error=e); return False
+            rec = {"username": username, "password": hash_password(password), "name": name, "role": role}
+            if not add_rows("Users", [list(rec.values())]): return False
+            with self.lock: self.users[username] = rec
+            return True
+
+@st.cache_resource
+def credential_index(): return CredentialIndex()
+
 def login_system():
+    begin_render("login")
     c1, c2, c3 = st.columns([1, 1.5, 1])
     with c2:
         st.markdown("<br><br>", unsafe_allow_html=True)
@@ -183,28 +1412,320 @@ def login_system():
             u = st.text_input("Username")
             p = st.text_input("Password", type="password")
             if st.button("SECURE LOGIN", use_container_width=True):
-                df = get_data("Users")
-                if not df.empty:
-                    df[['username', 'password']] = df[['username', 'password']].astype(str)
-                    user = df[(df['username'] == u) & (df['password'] == p)]
-                    if not user.empty:
-                        st.session_state.user = user.iloc[0].to_dict()
-                        st.success("Access Granted."); st.rerun()
-                    else: st.error("Invalid Credentials.")
+                user = credential_index().authenticate(u, p)
+                if user:
+                    st.session_state.user = user
+                    prefetch_for(st.session_state.user)
+                    st.success("Access Granted."); st.rerun()
+                elif credential_index().provisional:
+                    st.error("Invalid Credentials. Accounts are still syncing from a saved copy; if you signed up recently, try again in a moment.")
+                else: st.error("Invalid Credentials.")
         
         with tab2:
             nm = st.text_input("Full Name")
-            nu = st.text_input("New Username")
+            nu = st.text_input("New Username").strip()
             np = st.text_input("New Password", type="password")
             if st.button("CREATE ACCOUNT", use_container_width=True):
-                if add_row("Users", [nu, np, nm, "User"]):
-                    st.success("Account Created. Please Login."); st.rerun()
+                if not nu or not np: st.warning("Username and password are required.")
+                else:
+                    created = credential_index().register(nu, np, nm)
+                    if created == "taken": st.error("Username already taken.")
+                    elif created: st.success("Account Created. Please Login."); st.rerun()
+                    else: st.error("Registration failed. Please try again.")
+
+# ==========================================
+# 5. CHART DATA LAYER, VIEWS, BULK I/O & PROJECTIONS
+# ==========================================
+CHART_MAX_POINTS = 500  # points per series sent to the browser
+CHART_MAX_GROUPS = 25   # bars/slices before the smallest are folded into "Other"
+WEBGL_THRESHOLD = 1000  # above this many points, line/scatter render with WebGL
+
+def lttb(x, y, n):
+    # Largest-Triangle-Three-Buckets: indices of n points that keep the visual shape of the series.
+    size = len(x)
+    if n >= size or n < 3: return np.arange(size)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    idx = np.zeros(n, dtype=int); idx[-1] = size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (size - 1, size)
+        ax, ay = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - ax) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ay - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+def series_data(df, x, y, color=None, max_points=CHART_MAX_POINTS):
+    # One row per (series, x). Long datetime axes are bucketed by day/week/month, then LTTB'd.
+    keys = [color] if color else []
+    data = df[keys + [x, y]].dropna(subset=[x])
+    is_time = pd.api.types.is_datetime64_any_dtype(data[x])
+    if is_time and data[x].nunique() > max_points:
+        span = (data[x].max() - data[x].min()).days + 1
+        freq = "D" if span <= max_points else "W" if span / 7 <= max_points else "MS"
+        data = data.groupby(keys + [pd.Grouper(key=x, freq=freq)], observed=True)[y].sum().reset_index()
+    else: data = data.groupby(keys + [x], observed=True)[y].sum().reset_index()
+    parts = []
+    for _, g in (data.groupby(color, observed=True) if color else [(None, data)]):
+        g = g.sort_values(x)
+        if len(g) > max_points:
+            xs = g[x].to_numpy().astype("int64").astype(float) if is_time else np.arange(len(g), dtype=float)
+            g = g.iloc[lttb(xs, g[y].to_numpy(dtype=float), max_points)]
+        parts.append(g)
+    return pd.concat(parts, ignore_index=True) if parts else data
+
+def category_data(df, dims, value, max_groups=CHART_MAX_GROUPS):
+    # Totals per group; beyond max_groups values of dims[0], the smallest become "Other".
+    data = df[dims + [value]].copy()
+    for d in dims: data[d] = data[d].astype(str)
+    data = data.groupby(dims)[value].sum().reset_index()
+    totals = data.groupby(dims[0])[value].sum()
+    if len(totals) > max_groups:
+        keep = totals.nlargest(max_groups - 1).index
+        data[dims[0]] = data[dims[0]].where(data[dims[0]].isin(keep), "Other")
+        data = data.groupby(dims)[value].sum().reset_index()
+    return data.sort_values(value, ascending=False, ignore_index=True)
+
+def chart(kind, data, **kw):
+    import plotly.express as px
+    fn = {"area": px.area, "line": px.line, "bar": px.bar, "pie": px.pie, "scatter": px.scatter}[kind]
+    # Area stays px.area (WebGL lines would lose its stacking and fill); series_data caps its points.
+    if kind in ("line", "scatter") and len(data) > WEBGL_THRESHOLD:
+        fn, kw = (px.scatter if kind == "scatter" else px.line), {**kw, "render_mode": "webgl"}
+    return fn(data, **kw)
+
+# --- PAGED TABLES & LISTS (only the visible slice goes to the browser) ---
+PAGE_SIZES = [25, 50, 100]
+
+def paginate(df, key, search_cols=None):
+    c1, c2, c3, c4 = st.columns([2, 1.2, 0.8, 0.8])
+    q = c1.text_input("🔎 Filter", key=f"{key}_q", placeholder="Search...")
+    sort_col = c2.selectbox("Sort by", ["(sheet order)"] + list(df.columns), key=f"{key}_sort")
+    desc = c3.selectbox("Order", ["Asc", "Desc"], key=f"{key}_dir") == "Desc"
+    size = c4.selectbox("Rows", PAGE_SIZES, key=f"{key}_size")
+    if q:
+        cols = search_cols or list(df.columns)
+        mask = np.zeros(len(df), dtype=bool)
+        for col in cols: mask |= df[col].astype(str).str.contains(q, case=False, regex=False).to_numpy()
+        df = df[mask]
+    if sort_col in df.columns: df = df.sort_values(sort_col, ascending=not desc, kind="stable")
+    elif desc: df = df.iloc[::-1]
+    pages = max(1, -(-len(df) // size))
+    if st.session_state.get(f"{key}_page", 1) > pages: st.session_state[f"{key}_page"] = pages
+    page = st.number_input("Page", 1, pages, key=f"{key}_page")
+    st.caption(f"{len(df):,} rows · page {page} of {pages}")
+    return df.iloc[(page - 1) * size: page * size]
+
+def paged_table(df, key, **kw):
+    st.dataframe(paginate(df, key, **kw), use_container_width=True)
+
+def paged_list(df, key, render, **kw):
+    for _, r in paginate(df, key, **kw).iterrows(): render(r)
+
+# --- LOAN & PAYROLL PROJECTIONS (vectorized over every row, cached per data version) ---
+COMPOUNDING = {"Monthly": 12, "Quarterly": 4, "Half-Yearly": 2, "Yearly": 1}   # periods per year
+LOAN_DEFAULT_TENURE = 12        # months, for loans recorded before tenure was captured
+LOAN_DEFAULT_COMPOUNDING = "Monthly"
+LOAN_MAX_TENURE = 360
+PAYROLL_HISTORY = 12            # months shown before the current one
+PAYROLL_HORIZON = 12            # months projected after it
+PROJECTION_CACHE_TTL = 3600    # seconds; entries are keyed by data version, so this only bounds memory
+PROJECTION_CACHE_SIZE = 32
+
+@st.cache_resource
+def projection_cache(): return TTLCache(PROJECTION_CACHE_TTL, PROJECTION_CACHE_SIZE)
+
+def data_version(df, cols):
+    # Content hash of the columns a projection reads: any edit, add or delete changes it.
+    cols = [c for c in cols if c in df.columns]
+    return len(df), int(pd.util.hash_pandas_object(df[cols], index=False).sum()) if len(df) and cols else 0
+
+def cached_projection(name, df, cols, fn, *args):
+    key = (name, data_version(df, cols), args)
+    cache = projection_cache()
+    result = cache.get(key)
+    metrics().record(f"projection.{name}", hit=result is not None)
+    if result is None:
+        result = fn(df, *args)
+        cache.put(key, result)
+    return result
+
+def month_ord(dates, fill):
+    d = pd.to_datetime(dates, errors="coerce")
+    return (d.dt.year * 12 + d.dt.month - 1).fillna(fill).to_numpy(int)
+
+def ord_month(ords): return pd.to_datetime({"year": ords // 12, "month": ords % 12 + 1, "day": 1})
+
+def this_month(): return datetime.now().year * 12 + datetime.now().month - 1
+
+def loan_terms(loans):
+    # (principal, monthly rate, tenure) arrays; missing tenure/compounding fall back to the defaults.
+    n_rows = len(loans)
+    col = lambda c, default: loans[c] if c in loans.columns else pd.Series([default] * n_rows, index=loans.index)
+    principal = pd.to_numeric(col("amount", 0), errors="coerce").fillna(0).to_numpy(float)
+    annual = pd.to_numeric(col("interest_rate", 0), errors="coerce").fillna(0).to_numpy(float) / 100
+    tenure = pd.to_numeric(col("tenure_months", LOAN_DEFAULT_TENURE), errors="coerce").fillna(LOAN_DEFAULT_TENURE)
+    tenure = tenure.where(tenure >= 1, LOAN_DEFAULT_TENURE).clip(upper=LOAN_MAX_TENURE).round().to_numpy(int)
+    periods = col("compounding", LOAN_DEFAULT_COMPOUNDING).astype(str).map(COMPOUNDING).fillna(COMPOUNDING[LOAN_DEFAULT_COMPOUNDING]).to_numpy(float)
+    rate = (1 + annual / periods) ** (periods / 12) - 1     # effective monthly rate
+    return principal, rate, tenure
+
+def amortization(loans, today):
+    # Every loan's EMI schedule at once as (loans x months) arrays. Returns the per-loan
+    # summary and the portfolio by calendar month (payments, interest, outstanding balance).
+    if loans.empty: return pd.DataFrame(), pd.DataFrame()
+    principal, rate, tenure = loan_terms(loans)
+    start = month_ord(loans["date"], today)
+    k = np.arange(tenure.max() + 1)                          # payments made so far
+    growth = (1 + rate)[:, None] ** k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = np.where(rate > 0, principal * rate / (1 - (1 + rate) ** -tenure), principal / tenure)
+        balance = np.where(rate[:, None] > 0, principal[:, None] * growth - emi[:, None] * (growth - 1) / rate[:, None],
+                           principal[:, None] - emi[:, None] * k)
+    live = k <= tenure[:, None]
+    balance = np.where(live, np.clip(balance, 0, None), 0)
+    interest = balance[:, :-1] * rate[:, None]
+    paying = live[:, 1:]
+    paid = np.clip(today - start, 0, tenure)
+    rows = np.arange(len(loans))
+    summary = pd.DataFrame({"id": loans["id"].to_numpy() if "id" in loans.columns else rows, "app_name": loans["app_name"].astype(str).to_numpy(),
+                            "amount": principal, "interest_rate": loans["interest_rate"].to_numpy(), "tenure_months": tenure,
+                            "EMI": emi, "Total Interest": emi * tenure - principal, "Total Payable": emi * tenure,
+                            "Paid EMIs": paid, "Outstanding": balance[rows, paid], "Ends": ord_month(start + tenure).dt.strftime("%b %Y")})
+    # Payment j of a loan falls in month start + j; balance[:, j] is what is owed after it.
+    base = start.min()
+    slot = (start - base)[:, None] + k
+    span = int(slot[live].max()) + 1
+    owed = np.bincount(slot[live], weights=balance[live], minlength=span)
+    pay_slot = slot[:, 1:][paying]
+    emis = np.bincount(pay_slot, weights=np.broadcast_to(emi[:, None], paying.shape)[paying], minlength=span)
+    interests = np.bincount(pay_slot, weights=interest[paying], minlength=span)
+    portfolio = pd.DataFrame({"month": ord_month(base + np.arange(span)), "EMI": emis, "Interest": interests,
+                              "Principal": emis - interests, "Outstanding": owed})
+    return summary, portfolio
+
+def loan_schedule(loan, today):
+    # Month-by-month schedule for one loan (the portfolio's first row is the disbursal month).
+    return amortization(loan, today)[1].iloc[1:].reset_index(drop=True)
+
+def payroll_projection(jobs, today):
+    # Payroll and head count by shift per month, PAYROLL_HISTORY back to PAYROLL_HORIZON ahead.
+    # A job counts from its join month onward; cumulative sums replace a per-month loop.
+    first, months = today - PAYROLL_HISTORY, PAYROLL_HISTORY + PAYROLL_HORIZON + 1
+    if jobs.empty: return pd.DataFrame(columns=["month", "shift", "payroll", "staff"])
+    slot = np.clip(month_ord(jobs["date"], first) - first, 0, None)
+    keep = slot < months
+    shift = jobs["shift"].astype(str).replace("", "Unassigned").to_numpy()[keep]
+    codes, names = pd.factorize(shift)
+    salary = pd.to_numeric(jobs["salary"], errors="coerce").fillna(0).to_numpy(float)[keep]
+    pay, staff = np.zeros((len(names), months)), np.zeros((len(names), months))
+    np.add.at(pay, (codes, slot[keep]), salary)
+    np.add.at(staff, (codes, slot[keep]), 1)
+    pay, staff = pay.cumsum(axis=1), staff.cumsum(axis=1)
+    return pd.DataFrame({"month": np.tile(ord_month(first + np.arange(months)).to_numpy(), len(names)),
+                         "shift": np.repeat(names, months), "payroll": pay.ravel(), "staff": staff.ravel().astype(int)})
+
+# --- BULK IMPORT / EXPORT ---
+IMPORT_SHEETS = {"Expenses": "TXN", "Loans": "LN", "Jobs": "JB"}   # importable sheets -> id prefix
+IMPORT_OPTIONAL = {"id", "note", "user", "tenure_months", "compounding"}
+IMPORT_CHUNK = 500      # rows per append_rows call
+EXPORT_CHUNK = 5000     # rows per slice written to an export file
+
+def read_upload(upload):
+    if upload.name.lower().endswith((".xlsx", ".xls")): return pd.read_excel(upload, dtype=str).fillna("")
+    return pd.read_csv(upload, dtype=str, keep_default_na=False)
+
+def prepare_import(sheet_name, raw, digest, username, own_only=True):
+    # Returns (rows for append_rows, problems). Rows without an id get one derived from
+    # the file's digest, so uploading the same file again resumes instead of duplicating.
+    cols, key = SHEET_HEADERS[sheet_name], key_column(sheet_name)
+    raw = raw.rename(columns=lambda c: str(c).strip().lower())
+    missing = [c for c in cols if c not in raw.columns and c not in IMPORT_OPTIONAL]
+    if missing: return [], [f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(cols)}"]
+    df = raw.reindex(columns=cols, fill_value="").astype(str).apply(lambda s: s.str.strip())
+    if "user" in cols: df["user"] = username if own_only else df["user"].where(df["user"] != "", username)
+    auto = pd.Series([f"{IMPORT_SHEETS[sheet_name]}-{digest[:6]}-{i + 2}" for i in range(len(df))], index=df.index)
+    df[key] = df[key].where(df[key] != "", auto)
+    typed, issues = apply_schema(sheet_name, df)
+    problems = [f"Row {i['row']}: {i['column']} '{i['value']}' is not a valid {SCHEMAS[sheet_name][i['column']]}" for i in issues[:5]]
+    if len(issues) > 5: problems.append(f"... and {len(issues) - 5} more")
+    for col, kind in SCHEMAS[sheet_name].items():
+        if kind == "date": df[col] = typed[col].dt.strftime("%Y-%m-%d").fillna("")
+        elif kind == "num": df[col] = typed[col].map(lambda v: "" if pd.isna(v) else int(v) if float(v).is_integer() else float(v)).astype(object)
+    bad = {i["row"] - 2 for i in issues}
+    df = df[[i not in bad for i in range(len(df))]]
+    dupes = df[key].duplicated()
+    if dupes.any(): problems.append(f"{int(dupes.sum())} row(s) repeat an id already in the file and were skipped")
+    if bad: problems.append(f"{len(bad)} row(s) with unreadable values were skipped")
+    return df[~dupes].values.tolist(), problems
+
+def import_rows(sheet_name, rows, progress=None):
+    # Skips ids the sheet already has, then appends the rest IMPORT_CHUNK rows per call.
+    # Returns (skipped, imported, ok).
+    pos = SHEET_HEADERS[sheet_name].index(key_column(sheet_name))
+    have = get_data(sheet_name)
+    have = set(have[key_column(sheet_name)].astype(str)) if not have.empty else set()
+    todo = [r for r in rows if str(r[pos]) not in have]
+    for start in range(0, len(todo), IMPORT_CHUNK):
+        if not add_rows(sheet_name, todo[start:start + IMPORT_CHUNK]): return len(rows) - len(todo), start, False
+        if progress: progress(min(start + IMPORT_CHUNK, len(todo)), len(todo))
+    return len(rows) - len(todo), len(todo), True
+
+def bulk_import_ui(sheet_name, user, key):
+    own_only = user['role'] != "Admin"
+    with st.expander("📤 BULK IMPORT (CSV / Excel)"):
+        cols = SHEET_HEADERS[sheet_name]
+        st.caption(f"Columns: {', '.join(c for c in cols if c not in IMPORT_OPTIONAL)} · optional: {', '.join(c for c in cols if c in IMPORT_OPTIONAL and not (c == 'user' and own_only))}")
+        up = st.file_uploader("File", type=["csv", "xlsx"], key=f"{key}_file")
+        if up is None or not st.button("IMPORT", key=f"{key}_btn"): return
+        try: raw = read_upload(up)
+        except ImportError: st.error("Excel import needs the openpyxl package; upload a CSV instead."); return
+        except Exception as e: st.error(f"Could not read file: {e}"); return
+        rows, problems = prepare_import(sheet_name, raw, hashlib.sha1(up.getvalue()).hexdigest(), user['username'], own_only)
+        for p in problems: st.warning(p)
+        if not rows: return
+        bar = st.progress(0.0, text="Importing...")
+        skipped, done, ok = import_rows(sheet_name, rows, lambda d, n: bar.progress(d / n, text=f"Imported {d:,} of {n:,} rows"))
+        note = f", {skipped:,} already present" if skipped else ""
+        if ok: st.success(f"Imported {done:,} row(s){note}.")
+        else: st.error(f"Stopped after {done:,} row(s){note}. Upload the same file again to resume.")
+
+def export_file(chunks, sheet_name, fmt):
+    # Writes chunk by chunk to a temp file, so only one slice is converted at a time. Returns it
+    # reopened read-only: download_button takes a BufferedReader, not TemporaryFile's BufferedRandom.
+    with tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False) as out:
+        writer, first = None, True
+        for chunk in chunks:
+            if fmt == "csv": chunk.to_csv(out, index=False, header=first)
+            else:
+                import pyarrow as pa, pyarrow.parquet as pq
+                # Fixed column types, so every chunk matches the first one's schema (Parquet dictionary-encodes text itself).
+                fixed = {c: "float64" if k == "num" else str for c, k in SCHEMAS.get(sheet_name, {}).items() if k in ("num", "cat") and c in chunk.columns}
+                table = pa.Table.from_pandas(chunk.astype(fixed), preserve_index=False, schema=writer.schema if writer else None)
+                if writer is None: writer = pq.ParquetWriter(out, table.schema)
+                writer.write_table(table)
+            first = False
+        if writer: writer.close()
+        elif first and fmt == "csv": out.write((",".join(SHEET_HEADERS.get(sheet_name, [])) + "\n").encode("utf-8"))
+    fh = open(out.name, "rb")
+    try: os.remove(out.name)    # the open handle keeps the data until Streamlit has read it
+    except OSError: pass
+    return fh
+
+def export_ui(sheet_name, key, **where):
+    store = storage()
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Format", ["csv", "parquet"], key=f"{key}_fmt", label_visibility="collapsed")
+    c2.download_button(f"📥 Export {sheet_name} ({fmt.upper()})", lambda: export_file(store.chunks(sheet_name, EXPORT_CHUNK, **where), sheet_name, fmt),
+                       f"{sheet_name.lower()}.{fmt}", mime="text/csv" if fmt == "csv" else "application/octet-stream", key=f"{key}_dl", on_click="ignore")
 
 # ==========================================
-# 5. CORE APPLICATION
+# 6. CORE APPLICATION
 # ==========================================
 def main_app():
     user = st.session_state.user
+    st.markdown(APP_CSS, unsafe_allow_html=True)
     
     # --- SIDEBAR ---
     with st.sidebar:
@@ -216,23 +1737,38 @@ def main_app():
         </div>
         """, unsafe_allow_html=True)
         
-        api_key = st.secrets.get("GEMINI_API_KEY")
+        api_key = config("GEMINI_API_KEY")
         if not api_key: api_key = st.text_input("🔑 API Key", type="password")
         
         st.markdown("---")
         options = ["DASHBOARD", "🎬 LIVE FILMY DASHBOARD", "🧠 3D AI LAB", "💰 WALLET PRO 20.0", "✅ TASKS", "📓 NOTEBOOK", "📊 ATTENDANCE"]
         if user['role'] == "Admin":
-            options.extend(["💸 LOAN MANAGER (BOSS)", "🏢 STAFF JOBS PRO+5", "👥 USER MANAGER"])
+            options.extend(["💸 LOAN MANAGER (BOSS)", "🏢 STAFF JOBS PRO+5", "👥 USER MANAGER", "📈 SYSTEM MONITOR"])
         options.append("🚪 LOGOUT")
         
         menu = st.radio("NAVIGATION", options, label_visibility="collapsed")
+        begin_render(menu)
+
+        # --- SYNC STATUS (write-behind queue) ---
+        wq = storage().queue
+        unsaved = wq.size() if wq else 0
+        if unsaved:
+            if wq.backoff: st.warning(f"⚠️ {unsaved} row(s) not yet saved, retrying. {wq.stats['last_error']}")
+            else: st.caption(f"⏳ Saving {unsaved} row(s)...")
+            if st.button("🔄 SYNC NOW", key="sync_now"): flush_writes(); st.rerun()
+        elif wq: st.caption(f"✅ All changes saved{' · ' + wq.stats['last_flush'] if wq.stats['last_flush'] else ''}")
+        if wq and wq.dead:
+            st.error(f"❌ {len(wq.dead)} row(s) rejected by Google Sheets and not saved. {wq.dead[-1]['error']}")
+            if user['role'] == 'Admin':
+                with st.expander("Rejected rows"):
+                    st.dataframe(pd.DataFrame([{**d, "row": ", ".join(map(str, d["row"]))} for d in wq.dead]), hide_index=True)
+                    if st.button("DISMISS", key="dead_clear"): wq.dead.clear(); st.rerun()
         if menu == "🚪 LOGOUT": st.session_state.user = None; st.rerun()
 
     # --- DASHBOARD ---
     if menu == "DASHBOARD":
         st.title("🚀 Executive Dashboard")
-        df_exp = get_data("Expenses")
-        my_exp = df_exp[df_exp['user'] == user['username']] if not df_exp.empty else pd.DataFrame()
+        my_exp = monthly_totals("Expenses", user=user['username'])
         total_spend = my_exp['amount'].sum() if not my_exp.empty else 0
         
         c1, c2, c3 = st.columns(3)
@@ -242,7 +1778,8 @@ def main_app():
         
         st.markdown("### 📊 Financial Overview")
         if not my_exp.empty:
-            st.plotly_chart(px.area(my_exp, x='date', y='amount', color='category'), use_container_width=True)
+            trend = my_exp.assign(month=pd.to_datetime(my_exp['month'] + "-01", errors="coerce"))
+            st.plotly_chart(chart("area", series_data(trend, 'month', 'amount', 'category'), x='month', y='amount', color='category'), use_container_width=True)
 
     # --- 🎬 LIVE FILMY DASHBOARD (SMART PRO++) ---
     elif menu == "🎬 LIVE FILMY DASHBOARD":
@@ -279,7 +1816,7 @@ def main_app():
                 "Movie": ["Movie A", "Movie B", "Movie C", "Movie D"],
                 "Collection (Cr)": [500, 350, 200, 150]
             })
-            st.plotly_chart(px.bar(box_office_data, x='Movie', y='Collection (Cr)', title="Weekly Collections", color='Collection (Cr)'), use_container_width=True)
+            st.plotly_chart(chart("bar", box_office_data, x='Movie', y='Collection (Cr)', title="Weekly Collections", color='Collection (Cr)'), use_container_width=True)
 
         with col2:
             st.subheader("🍿 Quick Search")
@@ -304,14 +1841,15 @@ def main_app():
         if st.button("🚀 Launch Simulation"):
             if not topic: st.warning("Enter a topic.")
             else:
-                with st.spinner("Initializing AI..."):
-                    ai = EnterpriseAI(api_key)
-                    insight = ai.get_insight(f"Explain '{topic}' simply. Definition, Mechanism, Fact.")
-                    c1, c2 = st.columns([1, 1.5])
-                    with c1: st.markdown(f"<div class='metric-card' style='text-align:left;'><h3>Insight</h3><p>{insight}</p></div>", unsafe_allow_html=True)
-                    with c2:
-                        st.markdown(f"<div class='metric-card'><h3>3D Visualization</h3></div>", unsafe_allow_html=True)
-                        components.iframe(f"https://sketchfab.com/search?q={topic}&type=models", height=500, scrolling=True)
+                c1, c2 = st.columns([1, 1.5])
+                # Visualization first, so it loads while the model is still answering.
+                with c2:
+                    st.markdown(f"<div class='metric-card'><h3>3D Visualization</h3></div>", unsafe_allow_html=True)
+                    components.iframe(f"https://sketchfab.com/search?q={topic}&type=models", height=500, scrolling=True)
+                with c1:
+                    st.markdown("<div class='metric-card' style='text-align:left;'><h3>Insight</h3></div>", unsafe_allow_html=True)
+                    st.button("⏹ STOP", key="ai_stop")     # any rerun closes the stream below
+                    st.write_stream(ai_engine(api_key).stream_insight(f"Explain '{topic}' simply. Definition, Mechanism, Fact."))
 
     # --- 💰 WALLET PRO 20.0 ---
     elif menu == "💰 WALLET PRO 20.0":
@@ -329,12 +1867,14 @@ def main_app():
                     tid = f"TXN-{random.randint(10000,99999)}"
                     add_row("Expenses", [tid, str(d), c, a, user['username'], n])
                     st.success(f"Saved! ID: {tid}"); st.rerun()
+            bulk_import_ui("Expenses", user, "w_imp")
         
         with tab2:
-            df = get_data("Expenses")
+            df = get_data("Expenses") if user['role'] == 'Admin' else query_data("Expenses", user=user['username'])
             if not df.empty:
-                if user['role'] != 'Admin': df = df[df['user'] == user['username']]
-                st.dataframe(df, use_container_width=True)
+                paged_table(df, "w_tbl")
+                if user['role'] == 'Admin': export_ui("Expenses", "w_exp")
+                else: export_ui("Expenses", "w_exp", user=user['username'])
                 c1, c2 = st.columns(2)
                 with c1:
                     did = st.text_input("Enter ID to Delete", key="w_del")
@@ -348,19 +1888,23 @@ def main_app():
 
         with tab3:
             df = get_data("Expenses")
+            report_schema_issues("Expenses")
             if not df.empty:
                 c1, c2 = st.columns(2)
-                with c1: st.plotly_chart(px.pie(df, values='amount', names='category', title="Breakdown"), use_container_width=True)
-                with c2: st.plotly_chart(px.bar(df, x='category', y='amount', title="Trends"), use_container_width=True)
+                by_cat = category_data(df, ['category'], 'amount')
+                with c1: st.plotly_chart(chart("pie", by_cat, values='amount', names='category', title="Breakdown"), use_container_width=True)
+                with c2: st.plotly_chart(chart("bar", by_cat, x='category', y='amount', title="Trends"), use_container_width=True)
 
         with tab4:
-            df = get_data("Expenses")
-            if not df.empty:
-                df['date'] = pd.to_datetime(df['date']); df['MY'] = df['date'].dt.strftime('%B %Y')
-                sel = st.selectbox("Select Month", df['MY'].unique())
-                bill = df[df['MY']==sel]
-                st.markdown(f"<div class='metric-card'><h3>Total Bill</h3><h1>₹{bill['amount'].sum():,.0f}</h1></div>", unsafe_allow_html=True)
-                st.table(bill[['date','category','amount','note']])
+            months = monthly_totals("Expenses").groupby('month')['amount'].sum().sort_index(ascending=False)
+            if not months.empty:
+                sel = st.selectbox("Select Month", months.index, format_func=month_label)
+                st.markdown(f"<div class='metric-card'><h3>Total Bill</h3><h1>₹{months[sel]:,.0f}</h1></div>", unsafe_allow_html=True)
+                df = get_data("Expenses")
+                # Range compare on the typed date column; "" is the bucket for undated rows.
+                start = pd.Timestamp(f"{sel}-01") if sel else None
+                in_month = df['date'].isna() if start is None else (df['date'] >= start) & (df['date'] < start + pd.offsets.MonthBegin())
+                st.table(df[in_month][['date','category','amount','note']])
 
     # --- 💸 LOAN MANAGER ---
     elif menu == "💸 LOAN MANAGER (BOSS)":
@@ -373,15 +1917,19 @@ def main_app():
                     c1, c2 = st.columns(2)
                     ld = c1.date_input("Date"); la = c2.text_input("App Name")
                     lam = c1.number_input("Amount", min_value=0); lr = c2.number_input("Rate %", min_value=0.0)
+                    lt = c1.number_input("Tenure (months)", min_value=1, max_value=LOAN_MAX_TENURE, value=LOAN_DEFAULT_TENURE)
+                    lc = c2.selectbox("Compounding", list(COMPOUNDING))
                     ln = st.text_input("Note")
                     if st.form_submit_button("RECORD LOAN"):
-                        add_row("Loans", [f"LN-{random.randint(1000,9999)}", str(ld), la, lam, lr, ln])
+                        add_row("Loans", [f"LN-{random.randint(1000,9999)}", str(ld), la, lam, lr, ln, lt, lc])
                         st.success("Saved!")
+                bulk_import_ui("Loans", user, "l_imp")
             
             with t2:
                 df = get_data("Loans")
                 if not df.empty:
-                    st.dataframe(df, use_container_width=True)
+                    paged_table(df, "l_tbl")
+                    export_ui("Loans", "l_exp")
                     c1, c2 = st.columns(2)
                     with c1:
                         did = st.text_input("Loan ID to Delete", key="l_del")
@@ -395,23 +1943,31 @@ def main_app():
 
             with t3:
                 df = get_data("Loans")
+                report_schema_issues("Loans")
                 if not df.empty:
-                    df['amount'] = pd.to_numeric(df['amount'])
-                    st.plotly_chart(px.bar(df, x='app_name', y='amount', title="Loan Portfolio"), use_container_width=True)
+                    st.plotly_chart(chart("bar", category_data(df, ['app_name'], 'amount'), x='app_name', y='amount', title="Loan Portfolio"), use_container_width=True)
 
             with t4:
                 st.subheader("📉 Auto Loan Analysis")
                 df = get_data("Loans")
                 if not df.empty:
-                    df['amount'] = pd.to_numeric(df['amount'])
-                    df['interest_rate'] = pd.to_numeric(df['interest_rate'])
-                    df['Total Interest'] = df['amount'] * (df['interest_rate'] / 100)
-                    df['Total Payable'] = df['amount'] + df['Total Interest']
+                    today = this_month()
+                    summary, portfolio = cached_projection("loans", df, list(SCHEMAS["Loans"]), amortization, today)
+                    due = portfolio[portfolio['month'] == ord_month(np.array([today]))[0]]
                     
-                    c1, c2 = st.columns(2)
-                    c1.markdown(f"<div class='metric-card'><h3>Total Principal</h3><h2>₹{df['amount'].sum():,.0f}</h2></div>", unsafe_allow_html=True)
-                    c2.markdown(f"<div class='metric-card'><h3>Total Payable (inc. Interest)</h3><h2 style='color:#dc2626'>₹{df['Total Payable'].sum():,.0f}</h2></div>", unsafe_allow_html=True)
-                    st.dataframe(df[['app_name', 'amount', 'interest_rate', 'Total Interest', 'Total Payable']], use_container_width=True)
+                    c1, c2, c3 = st.columns(3)
+                    c1.markdown(f"<div class='metric-card'><h3>Total Principal</h3><h2>₹{summary['amount'].sum():,.0f}</h2></div>", unsafe_allow_html=True)
+                    c2.markdown(f"<div class='metric-card'><h3>Total Payable (inc. Interest)</h3><h2 style='color:#dc2626'>₹{summary['Total Payable'].sum():,.0f}</h2></div>", unsafe_allow_html=True)
+                    c3.markdown(f"<div class='metric-card'><h3>EMI Due This Month</h3><h2>₹{due['EMI'].sum():,.0f}</h2></div>", unsafe_allow_html=True)
+                    st.plotly_chart(chart("area", portfolio, x='month', y='Outstanding', title="Outstanding Balance"), use_container_width=True)
+                    st.plotly_chart(chart("bar", portfolio.melt(id_vars='month', value_vars=['Principal', 'Interest'], var_name='part', value_name='amount'),
+                                          x='month', y='amount', color='part', title="Monthly EMI Split"), use_container_width=True)
+                    paged_table(summary.round(2), "l_amort", search_cols=['id', 'app_name'])
+                    sid = st.text_input("Loan ID for full schedule", key="l_sched")
+                    if sid:
+                        one = df[df['id'].astype(str) == sid]
+                        if one.empty: st.warning("No loan with that ID.")
+                        else: st.dataframe(loan_schedule(one, today).round(2), use_container_width=True, hide_index=True)
 
         else: st.error("Access Denied")
 
@@ -430,11 +1986,13 @@ def main_app():
                     if st.form_submit_button("ADD RECORD"):
                         add_row("Jobs", [f"JB-{random.randint(1000,9999)}", str(jd), jn, jc, js, jam])
                         st.success("Added!")
+                bulk_import_ui("Jobs", user, "j_imp")
             
             with t2:
                 df = get_data("Jobs")
                 if not df.empty:
-                    st.dataframe(df, use_container_width=True)
+                    paged_table(df, "j_tbl")
+                    export_ui("Jobs", "j_exp")
                     c1, c2 = st.columns(2)
                     with c1:
                         did = st.text_input("Job ID to Delete", key="j_del")
@@ -450,15 +2008,19 @@ def main_app():
                 df = get_data("Jobs")
                 if not df.empty:
                     if 'name' in df.columns and 'salary' in df.columns:
-                        st.plotly_chart(px.bar(df, x='name', y='salary', color='shift', title="Salary Distribution"), use_container_width=True)
+                        st.plotly_chart(chart("bar", category_data(df, ['name', 'shift'], 'salary'), x='name', y='salary', color='shift', title="Salary Distribution"), use_container_width=True)
 
             with t4:
                 st.subheader("💵 Auto Salary & Payroll")
                 df = get_data("Jobs")
+                report_schema_issues("Jobs")
                 if not df.empty:
-                    df['salary'] = pd.to_numeric(df['salary'])
                     total_payroll = df['salary'].sum()
                     st.markdown(f"<div class='metric-card'><h3>Total Monthly Payroll</h3><h1 style='color:#16a34a'>₹{total_payroll:,.0f}</h1></div>", unsafe_allow_html=True)
+                    payroll = cached_projection("payroll", df, ['date', 'shift', 'salary'], payroll_projection, this_month())
+                    st.plotly_chart(chart("bar", payroll, x='month', y='payroll', color='shift', title="Payroll by Shift (month by month)"), use_container_width=True)
+                    ahead = payroll[payroll['month'] > ord_month(np.array([this_month()]))[0]]
+                    st.caption(f"Next {PAYROLL_HORIZON} months: ₹{ahead['payroll'].sum():,.0f} at current staffing.")
                     st.table(df[['name', 'company', 'shift', 'salary']])
 
         else: st.error("Access Denied")
@@ -470,21 +2032,64 @@ def main_app():
             df = get_data("Users")
             if not df.empty:
                 st.metric("Total Users", len(df))
-                st.dataframe(df, use_container_width=True)
-                st.download_button("📥 Export CSV", df.to_csv(index=False).encode('utf-8'), "users.csv")
+                paged_table(df, "u_tbl")
+                export_ui("Users", "u_exp")
             else: st.info("No users.")
         else: st.error("Access Denied")
 
+    # --- 📈 SYSTEM MONITOR (admin) ---
+    elif menu == "📈 SYSTEM MONITOR":
+        if user['role'] == "Admin":
+            st.title("📈 System Monitor")
+            snap = metrics().snapshot()
+            quota = snap["quota"]
+            st.subheader(f"Sheets quota (last {QUOTA_WINDOW}s, all sessions)")
+            q1, q2, q3 = st.columns(3)
+            q1.metric("Reads", f"{quota['read']} / {SHEETS_READ_QUOTA}")
+            q2.metric("Writes", f"{quota['write']} / {SHEETS_WRITE_QUOTA}")
+            q3.metric("AI calls", quota['ai'])
+            st.progress(min(quota['read'] / SHEETS_READ_QUOTA, 1.0), text="Read quota")
+            st.progress(min(quota['write'] / SHEETS_WRITE_QUOTA, 1.0), text="Write quota")
+            ops = snap["ops"]
+            st.caption(f"Throttled {ops.get('sheets.throttled', {}).get('calls', 0)}x · retried {ops.get('sheets.retry', {}).get('calls', 0)}x · "
+                       f"coalesced {ops.get('sheets.coalesced', {}).get('hits', 0)} read(s) · {len(sheets_client().inflight)} in flight")
+
+            st.subheader("Recent page renders (this session)")
+            renders = [{"time": r["time"], "page": r["page"], "op": op, **v} for r in reversed(st.session_state.get("render_history", [])) for op, v in r["ops"].items()]
+            if renders: st.dataframe(pd.DataFrame(renders).round(1), use_container_width=True, hide_index=True)
+            else: st.info("No renders recorded yet.")
+
+            st.subheader("Totals since start")
+            if snap["ops"]:
+                totals = pd.DataFrame.from_dict(snap["ops"], orient="index").rename_axis("op").reset_index()
+                totals["avg_ms"] = totals["ms"] / totals["calls"].where(totals["calls"] > 0)
+                st.dataframe(totals.sort_values("ms", ascending=False).round(1), use_container_width=True, hide_index=True)
+            if snap["errors"]:
+                st.subheader("Recent errors")
+                st.dataframe(pd.DataFrame(snap["errors"][::-1]), use_container_width=True, hide_index=True)
+            st.download_button("📥 Export metrics (JSON)", json.dumps(snap, indent=2, default=str).encode('utf-8'), "metrics.json")
+
+            snapshots = getattr(storage(), "snapshots", None)
+            if snapshots:
+                st.subheader("💾 On-disk snapshots")
+                st.caption(f"{os.path.abspath(snapshots.path)} · served on restart and during outages, re-synced in the background")
+                info = snapshots.info()
+                if info: st.dataframe(pd.DataFrame(info), use_container_width=True, hide_index=True)
+
+            st.subheader("📦 Export any sheet")
+            export_ui(st.selectbox("Sheet", list(SHEET_HEADERS), key="mon_sheet"), "mon_exp")
+            if config("METRICS_LOG"): st.caption(f"Structured log: {config('METRICS_LOG')}")
+        else: st.error("Access Denied")
+
     # --- TASKS ---
     elif menu == "✅ TASKS":
         st.title("✅ Tasks")
         with st.form("tsk"):
             tn = st.text_input("Task"); td = st.date_input("Due")
             if st.form_submit_button("Add"): add_row("Tasks", [str(td), tn, "Pending", user['username']]); st.success("Added")
-        df = get_data("Tasks")
+        df = query_data("Tasks", user=user['username'])
         if not df.empty:
-            for _, r in df[df['user']==user['username']].iterrows():
-                st.markdown(f"<div class='metric-card' style='padding:10px; text-align:left;'>⬜ {r['task']}</div>", unsafe_allow_html=True)
+            paged_list(df, "tasks", lambda r: st.markdown(f"<div class='metric-card' style='padding:10px; text-align:left;'>⬜ {r['task']}</div>", unsafe_allow_html=True))
 
     # --- NOTEBOOK ---
     elif menu == "📓 NOTEBOOK":
@@ -492,10 +2097,11 @@ def main_app():
         with st.form("nb"):
             ns = st.text_input("Subject"); nc = st.text_area("Note")
             if st.form_submit_button("Save"): add_row("Notebook", [str(datetime.now().date()), ns, nc, user['username']]); st.success("Saved")
-        df = get_data("Notebook")
+        df = query_data("Notebook", user=user['username'])
         if not df.empty:
-            for _, r in df[df['user']==user['username']].iterrows():
+            def note_card(r):
                 with st.expander(r['subject']): st.write(r['note'])
+            paged_list(df, "notes", note_card)
 
     # --- ATTENDANCE ---
     elif menu == "📊 ATTENDANCE":
@@ -503,8 +2109,13 @@ def main_app():
         with st.form("att"):
             asub = st.text_input("Subject/Event"); ast = st.radio("Status", ["Present","Absent"])
             if st.form_submit_button("Mark"): add_row("Attendance", [str(datetime.now().date()), asub, ast, user['username']]); st.success("Marked")
-        df = get_data("Attendance")
-        if not df.empty: st.dataframe(df[df['user']==user['username']])
+        df = query_data("Attendance", user=user['username'])
+        if not df.empty: paged_table(df, "att_tbl")
+
+    # --- STALE DATA NOTICE (after the page, so this render's reads count) ---
+    degraded, unverified = getattr(storage(), "degraded", {}), getattr(storage(), "unverified", set())
+    if degraded: st.sidebar.warning(f"⚠️ Google Sheets is busy; showing last loaded {', '.join(degraded)}.")
+    elif unverified: st.sidebar.caption(f"🔄 Showing saved copy of {', '.join(sorted(unverified))}; refreshing...")
 
 if __name__ == "__main__":
     if st.session_state.user: main_app()
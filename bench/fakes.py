@@ -0,0 +1,181 @@
+# In-process stand-ins for the gspread spreadsheet returned by connect_db() and for
+# google.generativeai, so app.py can be driven headlessly without network access.
+# Every remote-looking method bumps a counter on the owning FakeSpreadsheet.
+import random
+import re
+from collections import Counter
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from gspread.utils import a1_to_rowcol, numericise_all
+
+SHEETS = {
+    "Expenses": ["id", "date", "category", "amount", "user", "note"],
+    "Loans": ["id", "date", "app_name", "amount", "interest_rate", "note", "tenure_months", "compounding"],
+    "Jobs": ["id", "date", "name", "company", "shift", "salary"],
+    "Users": ["username", "password", "name", "role"],
+    "Tasks": ["date", "task", "status", "user"],
+    "Notebook": ["date", "subject", "note", "user"],
+    "Attendance": ["date", "subject", "status", "user"],
+}
+
+
+class FakeCell:
+    def __init__(self, row, col, value):
+        self.row, self.col, self.value = row, col, value
+
+
+class FakeWorksheet:
+    def __init__(self, book, title, rows=None):
+        self.book, self.title = book, title
+        self.rows = [[str(v) for v in r] for r in (rows or [])]
+
+    def _hit(self, op):
+        self.book.calls[op] += 1
+
+    def _range(self, rng):
+        m = re.match(r"([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$", rng.split("!")[-1].strip("'"))
+        if not m: return [list(r) for r in self.rows]
+        start = int(m.group(2) or 1)
+        end = int(m.group(4)) if m.group(4) else len(self.rows)
+        return [list(r) for r in self.rows[start - 1:end]]
+
+    def row_values(self, i):
+        self._hit("row_values")
+        return list(self.rows[i - 1]) if len(self.rows) >= i else []
+
+    def col_values(self, c):
+        self._hit("col_values")
+        return [r[c - 1] if len(r) >= c else "" for r in self.rows]
+
+    def get(self, rng=None, **kw):
+        self._hit("get")
+        return self._range(rng or "A1")
+
+    def get_all_values(self, **kw):
+        self._hit("get_all_values")
+        return [list(r) for r in self.rows]
+
+    def get_all_records(self, **kw):
+        self._hit("get_all_records")
+        if not self.rows: return []
+        head = self.rows[0]
+        return [dict(zip(head, numericise_all((r + [""] * len(head))[:len(head)]))) for r in self.rows[1:]]
+
+    def append_row(self, row, **kw):
+        self._hit("append_row")
+        self.rows.append([str(v) for v in row])
+
+    def append_rows(self, rows, **kw):
+        self._hit("append_rows")
+        self.rows.extend([str(v) for v in r] for r in rows)
+
+    def insert_row(self, row, index=1, **kw):
+        self._hit("insert_row")
+        self.rows.insert(index - 1, [str(v) for v in row])
+
+    def find(self, query, **kw):
+        self._hit("find")
+        for i, r in enumerate(self.rows):
+            for j, v in enumerate(r):
+                if v == query: return FakeCell(i + 1, j + 1, v)
+        return None
+
+    def delete_rows(self, start, end=None):
+        self._hit("delete_rows")
+        del self.rows[start - 1:(end or start)]
+
+    def _set(self, r, c, value):
+        row = self.rows[r - 1]
+        row.extend([""] * (c - len(row)))
+        row[c - 1] = str(value)
+
+    def update_cell(self, r, c, value):
+        self._hit("update_cell")
+        self._set(r, c, value)
+
+    def batch_update(self, data, **kw):
+        self._hit("batch_update")
+        for d in data: self._set(*a1_to_rowcol(d["range"]), d["values"][0][0])
+
+    def update(self, values, range_name="A1", **kw):
+        self._hit("update")
+        r, c = a1_to_rowcol(range_name)
+        for i, row in enumerate(values):
+            for j, v in enumerate(row): self._set(r + i, c + j, v)
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheets=None):
+        self.calls = Counter()
+        self.sheets = {name: FakeWorksheet(self, name, rows) for name, rows in (sheets or {}).items()}
+
+    def worksheet(self, name):
+        self.calls["worksheet"] += 1
+        if name not in self.sheets: self.sheets[name] = FakeWorksheet(self, name)
+        return self.sheets[name]
+
+    def get_lastUpdateTime(self):
+        # Drive's modifiedTime stand-in: changes whenever any cell does, however it was changed.
+        self.calls["get_lastUpdateTime"] += 1
+        return str(hash(tuple(tuple(r) for ws in self.sheets.values() for r in ws.rows)))
+
+    def values_batch_get(self, ranges, params=None):
+        self.calls["values_batch_get"] += 1
+        out = []
+        for rng in ranges:
+            ws = self.sheets.get(rng.split("!")[0].strip("'")) or FakeWorksheet(self, rng)
+            out.append({"range": rng, "values": ws._range(rng) if "!" in rng else [list(r) for r in ws.rows]})
+        return {"valueRanges": out}
+
+
+class FakeClient:
+    def __init__(self, book):
+        self.book = book
+
+    def open(self, name):
+        return self.book
+
+
+# --- google.generativeai ---
+class FakeGenAI:
+    def __init__(self, book):
+        self.book = book
+
+    def configure(self, **kw):
+        self.book.calls["genai.configure"] += 1
+
+    def default_client(self):
+        return SimpleNamespace(name="fake-generative-client")
+
+    def GenerativeModel(self, name):
+        book = self.book
+
+        class Model:
+            def generate_content(self, prompt, stream=False, **kw):
+                book.calls["genai.generate_content"] += 1
+                words = f"{name} insight: {prompt}".split()
+                chunks = [SimpleNamespace(text=w + " ") for w in words]
+                return iter(chunks) if stream else SimpleNamespace(text="".join(c.text for c in chunks))
+        return Model()
+
+
+# --- synthetic data ---
+def synthetic_book(rows, seed=7):
+    rnd = random.Random(seed)
+    start = date(2015, 1, 1)
+    day = lambda: str(start + timedelta(days=rnd.randrange(3650)))
+    users = ["admin"] + [f"user{i}" for i in range(max(1, min(rows, 1000)) - 1)]
+    who = lambda: rnd.choice(users[:50])
+    cats = ["Food", "Rent", "Travel", "Bills", "Fun", "Health"]
+    data = {name: [cols] for name, cols in SHEETS.items()}
+    data["Users"] += [["admin", "admin", "Admin", "Admin"]] + [[u, "pw", u.title(), "User"] for u in users[1:]]
+    for i in range(rows):
+        data["Expenses"].append([f"TXN-{i}", day(), rnd.choice(cats), rnd.randrange(10, 5000), who(), ""])
+        data["Loans"].append([f"LN-{i}", day(), rnd.choice(["KreditBee", "Navi", "Slice"]), rnd.randrange(1000, 90000), rnd.choice([12, 14.5, 18]), "",
+                              rnd.choice([6, 12, 24, 60, 120]), rnd.choice(["Monthly", "Quarterly", "Yearly"])])
+        data["Jobs"].append([f"JB-{i}", day(), f"Staff {i}", rnd.choice(["Acme", "Globex"]), rnd.choice(["Full Day", "Half Day", "Night Shift"]), rnd.randrange(8000, 40000)])
+        data["Tasks"].append([day(), f"Task {i}", "Pending", who()])
+        data["Notebook"].append([day(), f"Note {i}", "lorem ipsum", who()])
+        data["Attendance"].append([day(), f"Class {i % 20}", rnd.choice(["Present", "Absent"]), who()])
+    return FakeSpreadsheet(data)
@@ -0,0 +1,148 @@
+"""Offline page-render benchmark for app.py.
+
+Drives login_system and every main_app menu page headlessly through Streamlit's
+AppTest, with connect_db()'s spreadsheet and google.generativeai replaced by the
+in-process fakes in bench/fakes.py. For each data size and page it reports wall
+time, remote calls (Sheets + Gemini) and peak Python memory.
+
+    python bench/run.py --sizes 1000 10000 100000
+    python bench/run.py --sizes 1000 --max-calls 2 --json bench_output.json
+
+"cold" is the first render after switching to a page, "warm" an immediate rerun
+of it. Every export button the pages rendered is then downloaded (its deferred callable
+run through Streamlit's own conversion, as a click would). Each size ends with a simulated restart (fresh process-wide caches, same
+on-disk snapshot directory) timing login and the dashboard again. With --max-calls the run exits non-zero if any render makes more remote
+calls than allowed, so a regression in API calls per render fails CI.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fakes import FakeClient, FakeGenAI, synthetic_book  # noqa: E402
+
+import streamlit as st  # noqa: E402
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PAGES = ["DASHBOARD", "🎬 LIVE FILMY DASHBOARD", "🧠 3D AI LAB", "💰 WALLET PRO 20.0", "✅ TASKS", "📓 NOTEBOOK",
+         "📊 ATTENDANCE", "💸 LOAN MANAGER (BOSS)", "🏢 STAFF JOBS PRO+5", "👥 USER MANAGER", "📈 SYSTEM MONITOR"]
+
+
+def measure(book, fn, memory=True):
+    book.calls.clear()
+    if memory: tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if memory else 0
+    if memory: tracemalloc.stop()
+    return {"wall_s": round(wall, 4), "calls": sum(book.calls.values()), "by_call": dict(book.calls), "peak_mb": round(peak / 1e6, 2)}
+
+
+def bench_size(rows, pages, memory=True, timeout=900):
+    st.cache_resource.clear()   # storage(), connect_db() etc. are process-wide between AppTest runs
+    book = synthetic_book(rows)
+    genai = FakeGenAI(book)
+    snapshots = tempfile.mkdtemp(prefix="luxora-bench-")
+    results = []
+    downloads = {}      # file name -> deferred download_button callable from the last render
+    add_deferred = MediaFileManager.add_deferred
+
+    def capture(self, data, mimetype, coordinates, file_name=None, **kw):
+        downloads[file_name] = data
+        return add_deferred(self, data, mimetype, coordinates, file_name=file_name, **kw)
+
+    with mock.patch("gspread.authorize", return_value=FakeClient(book)), \
+            mock.patch("oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_dict"), \
+            mock.patch.object(MediaFileManager, "add_deferred", capture), \
+            mock.patch("google.generativeai.configure", genai.configure), \
+            mock.patch("google.generativeai.client.get_default_generative_client", genai.default_client), \
+            mock.patch("google.generativeai.GenerativeModel", genai.GenerativeModel):
+        def start():
+            at = AppTest.from_file(APP, default_timeout=timeout)
+            at.secrets["gcp_service_account"] = {"type": "fake"}
+            at.secrets["GEMINI_API_KEY"] = "fake"
+            at.secrets["STORAGE_BACKEND"] = "sheets"
+            at.secrets["SNAPSHOT_DIR"] = snapshots
+            return at
+        at = start()
+
+        def record(page, phase, fn):
+            r = measure(book, fn, memory)
+            r.update(rows=rows, page=page, phase=phase, error=str(at.exception[0].message) if at.exception else None)
+            results.append(r)
+
+        record("login_system", "render", at.run)
+
+        def login():
+            at.text_input[0].input("admin"); at.text_input[1].input("admin")
+            at.button[0].click().run()
+        record("login_system", "submit", login)
+
+        for page in pages:
+            def open_page():
+                at.sidebar.radio[0].set_value(page).run()
+                if page == "🧠 3D AI LAB":
+                    at.text_input[0].input("Heart")
+                    [b for b in at.button if "Launch" in b.label][0].click().run()
+            record(page, "cold", open_page)
+            record(page, "warm", at.run)
+        if "📈 SYSTEM MONITOR" in pages:
+            at.sidebar.radio[0].set_value("📈 SYSTEM MONITOR").run()
+            at.selectbox(key="mon_exp_fmt").set_value("parquet").run()
+
+        for name, data in sorted(downloads.items()):
+            failed = []
+
+            def download():
+                try: convert_data_to_bytes_and_infer_mime(data(), unsupported_error=TypeError(f"{name}: unsupported download type"))
+                except Exception as e: failed.append(e)
+            record(f"export {name}", "download", download)
+            if failed: results[-1]["error"] = str(failed[0])
+
+        # Restart: process-wide caches are gone, the snapshots on disk are not.
+        time.sleep(1)   # let background snapshot writes finish
+        st.cache_resource.clear()
+        at = start()
+        record("restart", "render", at.run)
+        record("restart", "submit", login)
+        record("restart DASHBOARD", "cold", lambda: at.sidebar.radio[0].set_value("DASHBOARD").run())
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--pages", nargs="+", default=PAGES, help="menu labels to render (default: all)")
+    ap.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows renders down)")
+    ap.add_argument("--max-calls", type=int, help="fail if any render makes more remote calls than this")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = []
+    for rows in args.sizes: results += bench_size(rows, args.pages, memory=not args.no_memory)
+
+    print(f"{'rows':>8}  {'page':<26} {'phase':<7} {'wall s':>8} {'calls':>6} {'peak MB':>8}  error")
+    for r in results:
+        print(f"{r['rows']:>8}  {r['page']:<26} {r['phase']:<7} {r['wall_s']:>8.3f} {r['calls']:>6} {r['peak_mb']:>8.1f}  {r['error'] or ''}")
+    if args.json:
+        with open(args.json, "w") as fh: json.dump(results, fh, indent=2, ensure_ascii=False)
+
+    over = [r for r in results if args.max_calls is not None and r["calls"] > args.max_calls]
+    errors = [r for r in results if r["error"]]
+    for r in over: print(f"OVER BUDGET: {r['page']} ({r['phase']}, {r['rows']} rows) made {r['calls']} calls: {r['by_call']}")
+    sys.exit(1 if over or errors else 0)
+
+
+if __name__ == "__main__":
+    main()
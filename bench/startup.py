@@ -0,0 +1,62 @@
+"""Cold-start benchmark for app.py: time to the login screen in a fresh process.
+
+Each run starts a new Python interpreter (so nothing is in sys.modules yet, as on a
+freshly started container), renders the login screen headlessly through AppTest
+and reports how long that took and which heavy dependencies it had to import.
+
+    python bench/startup.py --runs 5
+    python bench/startup.py --runs 5 --json startup.json
+
+"import" is the time to import streamlit itself (paid by any Streamlit app),
+"login" the first script run up to the rendered login screen.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+HEAVY = ["plotly.express", "gspread", "oauth2client", "google.generativeai"]
+
+CHILD = """
+import json, logging, sys, time
+t0 = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+logging.disable(logging.WARNING)
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.secrets["STORAGE_BACKEND"] = "sheets"
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "login_s": t2 - t1, "error": str(at.exception[0].message) if at.exception else None,
+                  "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def run_once():
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", CHILD, APP, *HEAVY], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    med = lambda k: statistics.median(r[k] for r in results)
+    print(f"{'run':>4} {'import s':>9} {'login s':>8}  loaded")
+    for i, r in enumerate(results, 1):
+        print(f"{i:>4} {r['import_s']:>9.3f} {r['login_s']:>8.3f}  {', '.join(r['loaded']) or '-'}  {r['error'] or ''}")
+    print(f"{'med':>4} {med('import_s'):>9.3f} {med('login_s'):>8.3f}")
+    if args.json:
+        with open(args.json, "w") as fh: json.dump(results, fh, indent=2)
+    sys.exit(1 if any(r["error"] for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()